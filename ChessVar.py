@@ -1,616 +1,2963 @@
-# Author: Zhiwei Cai
-# GitHub username: zwcai0110
-# Date: 11/17/2023
-# Description: portfolio project that plays a chess game with slight variations
-
-class Piece:
-    '''
-    parent class that represents different pieces
-    '''
-
-    def __init__(self, color, name):
-        self._color = color
-        self._name = name
-        self._num = None
-
-    def get_color(self):
-        '''
-        gets the color of the piece
-        :return: color of the piece
-        '''
-        return self._color
-
-    def get_name(self):
-        '''
-        gets the name of the piece
-        :return: name of the piece
-        '''
-        return self._name
-
-    def get_num(self):
-        '''
-        gets the number of this type/color of piece left on the board
-        :return: number of the piece
-        '''
-        return self._num
-
-    def update_num(self, num):
-        '''
-        updates the number of this type/color of piece left on the board
-        :return: nothing
-        '''
-        self._num = num
-
-
-class King(Piece):
-    '''
-    represents king
-    '''
-
-    def __init__(self, color, name):
-        super().__init__(color, name)
-        self._num = 1
-
-    def check_legal(self, start, end, board):
-        '''
-        checks whether a move is legal
-        :param start: start position
-        :param end: end position
-        :param board: current board info
-        :return: whether the move is legal
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-
-        # check whether 'start' and 'end' are out of bound
-        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
-            return False
-        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
-            return False
-
-        # if the endpoint is occupied
-        if board[e_row][e_col].get_color() != '':
-            # check if it's occupied by a piece of the same color
-            if board[e_row][e_col].get_color() == board[s_row][s_col].get_color():
-                # if so, return false
-                return False
-
-        # check if the move is only 1 square and within 8 legal directions
-        if (e_col, e_row) == (s_col + 1, s_row + 1) or (e_col, e_row) == (s_col - 1, s_row - 1) or \
-                (e_col, e_row) == (s_col + 1, s_row - 1) or (e_col, e_row) == (s_col - 1, s_row + 1) or \
-                (e_col, e_row) == (s_col + 1, s_row) or (e_col, e_row) == (s_col, s_row + 1) or \
-                (e_col, e_row) == (s_col - 1, s_row) or (e_col, e_row) == (s_col, s_row - 1):
-            # if legal, return true
-            return True
-        # otherwise, return false
-        return False
-
-
-class Queen(Piece):
-    '''
-    represents queen
-    '''
-
-    def __init__(self, color, name):
-        super().__init__(color, name)
-        self._num = 1
-
-    def check_legal(self, start, end, board):
-        '''
-        checks whether a move is legal
-        :param start: start position
-        :param end: end position
-        :param board: current board info
-        :return: whether the move is legal
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-
-        # store the color of the piece making the move
-        s_color = board[s_row][s_col].get_color()
-        # check whether 'start' and 'end' are out of bound
-        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
-            return False
-        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
-            return False
-        # check when moving diagonally, whether the change in x is the same as the change in y
-        if s_row != e_row and s_col != e_col and abs(s_row - e_row) != abs(s_col - e_col):
-            # if not moving truly 1:1 diagonally, return false
-            return False
-
-        # check the case that the endpoint is already occupied
-        if board[e_row][e_col] != '':
-            # check if the piece is of the same color
-            if board[e_row][e_col].get_color() == s_color:
-                # if so, return false
-                return False
-
-        # scenario when queen is moving straight down
-        if s_col == e_col and s_row < e_row:
-            # keep moving down 1 square at a time to check if there's any piece in the way
-            while s_row < e_row - 1:
-                s_row += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving straight up
-        if s_col == e_col and s_row > e_row:
-            # keep moving up 1 square at a time to check if there's any piece in the way
-            while s_row > e_row + 1:
-                s_row -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving straight right
-        if s_row == e_row and s_col < e_col:
-            # keep moving right 1 square at a time to check if there's any piece in the way
-            while s_col < e_col - 1:
-                s_col += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving straight left
-        if s_row == e_row and s_col > e_col:
-            # keep moving left 1 square at a time to check if there's any piece in the way
-            while s_col > e_col + 1:
-                s_col -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, down and to the left
-        if s_row < e_row and s_col > e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row < e_row - 1 and s_col > e_col + 1:
-                s_row += 1
-                s_col -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, down and to the right
-        if s_row < e_row and s_col < e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row < e_row - 1 and s_col < e_col - 1:
-                s_row += 1
-                s_col += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, up and to the left
-        if s_row > e_row and s_col > e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row > e_row + 1 and s_col > e_col + 1:
-                s_row -= 1
-                s_col -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, up and to the right
-        if s_row > e_row and s_col < e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row > e_row + 1 and s_col < e_col - 1:
-                s_row -= 1
-                s_col += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-        # if nothing goes wrong, return true
-        return True
-
-
-class Pawn(Piece):
-    '''
-    represents pawn
-    '''
-
-    def __init__(self, color, name):
-        super().__init__(color, name)
-        self._num = 8
-
-    def check_legal(self, start, end, board):
-        '''
-        checks whether a move is legal
-        :param start: start position
-        :param end: end position
-        :param board: current board info
-        :return: whether the move is legal
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-        # store the color of the piece making the move
-        s_color = board[s_row][s_col].get_color()
-        # check whether 'start' and 'end' are out of bound
-        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
-            return False
-        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
-            return False
-
-        # check the case that the endpoint is already occupied
-        if board[e_row][e_col] != '':
-            # check if the piece is of the same color
-            if board[e_row][e_col].get_color() == s_color:
-                # if so, return false
-                return False
-
-            # otherwise, if the piece in the endpoint is not ours, we are capturing an opponent's piece
-            # when the piece we are moving is black
-            if board[s_row][s_col].get_color() == 'black':
-                # check if moving 1 square diagonally down and either to the left or right
-                if (e_col, e_row) != (s_col + 1, s_row + 1) and (e_col, e_row) != (s_col - 1, s_row + 1):
-                    # if not, return false
-                    return False
-
-            # when the piece we are moving is white
-            if board[s_row][s_col].get_color() == 'white':
-                # check if moving 1 square diagonally up and either to the left or right
-                if (e_col, e_row) != (s_col + 1, s_row - 1) and (e_col, e_row) != (s_col - 1, s_row - 1):
-                    # if not, return false
-                    return False
-
-        # if we are simply moving and not capturing
-        if board[e_row][e_col] == '':
-            # check if we are only moving up and down and not diagonally
-            if s_col != e_col:
-                # if moving side to side, return false
-                return False
-
-            # scenario where we are moving a black piece
-            if board[s_row][s_col].get_color() == 'black':
-                # case where this is the first move
-                if s_row == 1:
-                    # then check if moving no more than 2 squares, or if there's not another piece blocking
-                    if e_row > s_row + 2 or board[s_row + 1][s_col] != '':
-                        # return false otherwise
-                        return False
-                # case where this is not the first move
-                else:
-                    # check if only moving 1 square
-                    if e_row != s_row + 1:
-                        # if not, return false
-                        return False
-
-            # scenario where we are moving a white piece
-            if board[s_row][s_col].get_color() == 'white':
-                # case where this is the first move
-                if s_row == 6:
-                    # then check if moving more than 2 squares, or if there's not another piece blocking
-                    if e_row < s_row - 2 or board[s_row - 1][s_col] != '':
-                        # return false otherwise
-                        return False
-                # case where this is not the first move
-                else:
-                    # check if only moving 1 square
-                    if e_row != s_row - 1:
-                        # if not, return false
-                        return False
-        # if nothing goes wrong, return true
-        return True
-
-
-class Rook(Piece):
-    '''
-    represents rook
-    '''
-
-    def __init__(self, color, name):
-        super().__init__(color, name)
-        self._num = 2
-
-    def check_legal(self, start, end, board):
-        '''
-        checks whether a move is legal
-        :param start: start position
-        :param end: end position
-        :param board: current board info
-        :return: whether the move is legal
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-        # store the color of the piece making the move
-        s_color = board[s_row][s_col].get_color()
-        # check whether 'start' and 'end' are out of bound
-        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
-            return False
-        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
-            return False
-
-        # check if moving diagonally, which is illegal for rook
-        if s_col != e_col and s_row != e_row:
-            # if so, return false
-            return False
-
-        # check the case that the endpoint is already occupied
-        if board[e_row][e_col] != '':
-            # check if the piece is of the same color
-            if board[e_row][e_col].get_color() == s_color:
-                # if so, return false
-                return False
-
-        # scenario when queen is moving straight down
-        if s_col == e_col and s_row < e_row:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row < e_row - 1:
-                s_row += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving straight up
-        if s_col == e_col and s_row > e_row:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row > e_row + 1:
-                s_row -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving straight right
-        if s_row == e_row and s_col < e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_col < e_col - 1:
-                s_col += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving straight left
-        if s_row == e_row and s_col > e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_col > e_col + 1:
-                s_col -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-        # if nothing goes wrong, return true
-        return True
-
-
-class Bishop(Piece):
-    '''
-    represents bishop
-    '''
-
-    def __init__(self, color, name):
-        super().__init__(color, name)
-        self._num = 2
-
-    def check_legal(self, start, end, board):
-        '''
-        checks whether a move is legal
-        :param start: start position
-        :param end: end position
-        :param board: current board info
-        :return: whether the move is legal
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-        # store the color of the piece making the move
-        s_color = board[s_row][s_col].get_color()
-        # check whether 'start' and 'end' are out of bound
-        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
-            return False
-        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
-            return False
-        # check whether moving purely diagonally, since bishop cannot move any other way
-        if s_col == e_col or s_row == e_row or abs(s_row - e_row) != abs(s_col - e_col):
-            # if not moving diagonally or change in x and y not equal, return false
-            return False
-
-        # check the case that the endpoint is already occupied
-        if board[e_row][e_col] != '':
-            # check if the piece is of the same color
-            if board[e_row][e_col].get_color() == s_color:
-                # if so, return false
-                return False
-
-        # scenario when queen is moving diagonally, down and to the left
-        if s_row < e_row and s_col > e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row < e_row - 1 and s_col > e_col + 1:
-                s_row += 1
-                s_col -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, down and to the right
-        if s_row < e_row and s_col < e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row < e_row - 1 and s_col < e_col - 1:
-                s_row += 1
-                s_col += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, up and to the left
-        if s_row > e_row and s_col > e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row > e_row + 1 and s_col > e_col + 1:
-                s_row -= 1
-                s_col -= 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-
-        # scenario when queen is moving diagonally, up and to the right
-        if s_row > e_row and s_col < e_col:
-            # keep moving 1 square at a time to check if there's any piece in the way
-            while s_row > e_row + 1 and s_col < e_col - 1:
-                s_row -= 1
-                s_col += 1
-                # if there's a piece blocking the path, return false
-                if board[s_row][s_col] != '':
-                    return False
-        # if nothing goes wrong, return true
-        return True
-
-
-class Knight(Piece):
-    '''
-    represents knight
-    '''
-
-    def __init__(self, color, name):
-        super().__init__(color, name)
-        self._num = 2
-
-    def check_legal(self, start, end, board):
-        '''
-        checks whether a move is legal
-        :param start: start position
-        :param end: end position
-        :param board: current board info
-        :return: whether the move is legal
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-        # store the color of the piece making the move
-        s_color = board[s_row][s_col].get_color()
-        # check whether 'start' and 'end' are out of bound
-        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
-            return False
-        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
-            return False
-
-        # check the case that the endpoint is already occupied
-        if board[e_row][e_col] != '':
-            # check if the piece is of the same color
-            if board[e_row][e_col].get_color() == s_color:
-                # if so, return false
-                return False
-
-        # check if the move is only 1 square and within 8 legal directions
-        if (e_col, e_row) == (s_col + 2, s_row + 1) or (e_col, e_row) == (s_col - 2, s_row - 1) or \
-                (e_col, e_row) == (s_col + 2, s_row - 1) or (e_col, e_row) == (s_col - 2, s_row + 1) or \
-                (e_col, e_row) == (s_col + 1, s_row - 2) or (e_col, e_row) == (s_col + 1, s_row + 2) or \
-                (e_col, e_row) == (s_col - 1, s_row - 2) or (e_col, e_row) == (s_col - 1, s_row + 2):
-            return True
-        # otherwise, return false
-        return False
-
-
-class ChessVar:
-    '''
-    main class that represents the game
-    '''
-
-    def __init__(self):
-        self._R = Rook('black', 'R')
-        self._N = Knight('black', 'N')
-        self._B = Bishop('black', 'B')
-        self._Q = Queen('black', 'Q')
-        self._K = King('black', 'K')
-        self._P = Pawn('black', 'P')
-
-        self._r = Rook('white', 'r')
-        self._n = Knight('white', 'n')
-        self._b = Bishop('white', 'b')
-        self._q = Queen('white', 'q')
-        self._k = King('white', 'k')
-        self._p = Pawn('white', 'p')
-
-        self._turn = 0
-        self._state = 'UNFINISHED'
-
-        self._board = [
-            [self._R, self._N, self._B, self._Q, self._K, self._B, self._N, self._R],
-            [self._P] * 8,
-            [''] * 8,
-            [''] * 8,
-            [''] * 8,
-            [''] * 8,
-            [self._p] * 8,
-            [self._r, self._n, self._b, self._q, self._k, self._b, self._n, self._r]
-        ]
-
-    def print_board(self):
-        '''
-        prints the current board configuration
-        :return: nothing
-        '''
-        # initialize the column labels
-        col_labels = '   a  b  c  d  e  f  g  h  '
-        print(col_labels)  # print the labels for the first line
-        for i, row in enumerate(self._board):
-            row_num = str(8 - i)  # get current row number
-            row_string = ' '.join([' ' + (piece.get_name() if piece != '' else '.') for piece in row])
-            print(f"{row_num} {row_string} {row_num}")  # formatting
-        print(col_labels)  # print the labels for the last line
-
-    def get_game_state(self):
-        '''
-        gets the current game state
-        :return: current game state
-        '''
-        return self._state
-
-    def make_move(self, start, end):
-        '''
-        moves the piece in "start" to "end"; relies on get_color() from the Piece class to determine the color of
-        the pieces, both to determine who's turn it is and whowon the game; relies on check_legal() from all classes
-        representing different type of pieces to determine if the proposed move is valid; depends on get_num() and
-        update_num() from the Piece class to keep track of the number of pieces left on the board.
-        :param start: the square we are starting with
-        :param end: the square we are moving the piece into
-        :return: false if the move is invalid, true if otherwise
-        '''
-        # first, convert algebraic notation to indices
-        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
-        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
-        # get info for the square we are starting with and moving into
-        s = self._board[s_row][s_col]
-        e = self._board[e_row][e_col]
-
-        # get current board
-        board = self._board
-
-        # check whose turn it is. Use remainder to alternate between black and white, then increment by 1 at the end
-        if self._turn % 2 == 0:
-            turn = 'white'
-        else:
-            turn = 'black'
-
-        # check if it's not the current color's turn to move or if the game has finished
-        if s == '' or s.get_color() != turn or self._state != 'UNFINISHED':
-            # if so, return false
-            print('false')
-            return False
-
-        # check whether the move is legal for the type of piece we are moving
-        if_valid = s.check_legal(start, end, self._board)
-        # return false if the move is not legal
-        if if_valid is False:
-            print('false')
-            return False
-
-        # otherwise, the move is legal, and we move the piece from start to end
-        board[s_row][s_col] = ''
-        board[e_row][e_col] = s
-
-        # in case of capturing
-        if e != '':
-            e.update_num(e.get_num() - 1)
-            if e.get_num() == 0:
-                if s.get_color() == 'white':
-                    self._state = 'WHITE_WON'
-                else:
-                    self._state = 'BLACK_WON'
-        # update the turn counter to alternate between black and white each turn
-        self._turn += 1
-
-        # if nothing goes wrong, return true
-        return True
-
+# Author: Zhiwei Cai
+# GitHub username: zwcai0110
+# Date: 11/17/2023
+# Description: portfolio project that plays a chess game with slight variations
+
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from itertools import repeat
+
+
+class Piece:
+    '''
+    parent class that represents different pieces
+    '''
+
+    def __init__(self, color, name):
+        self._color = color
+        self._name = name
+        self._num = None
+
+    def get_color(self):
+        '''
+        gets the color of the piece
+        :return: color of the piece
+        '''
+        return self._color
+
+    def get_name(self):
+        '''
+        gets the name of the piece
+        :return: name of the piece
+        '''
+        return self._name
+
+    def get_num(self):
+        '''
+        gets the number of this type/color of piece left on the board
+        :return: number of the piece
+        '''
+        return self._num
+
+    def update_num(self, num):
+        '''
+        updates the number of this type/color of piece left on the board
+        :return: nothing
+        '''
+        self._num = num
+
+
+class King(Piece):
+    '''
+    represents king
+    '''
+
+    def __init__(self, color, name):
+        super().__init__(color, name)
+        self._num = 1
+
+    def gen_moves(self, sq, board, rules=None):
+        '''
+        gets every square this piece can move to, using the tables precomputed at import
+        :param sq: square index of the piece (row * 8 + col)
+        :param board: current board info
+        :param rules: Variant whose tables to use, STANDARD by default
+        :return: list of end square indices
+        '''
+        return _jump(sq, board, self._color, (rules or STANDARD).king_jumps)
+
+    def check_legal(self, start, end, board):
+        '''
+        checks whether a move is legal
+        :param start: start position
+        :param end: end position
+        :param board: current board info
+        :return: whether the move is legal
+        '''
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
+
+        # check whether 'start' and 'end' are out of bound
+        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
+            return False
+        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
+            return False
+
+        # if the endpoint is occupied
+        if board[e_row][e_col] != '':
+            # check if it's occupied by a piece of the same color
+            if board[e_row][e_col].get_color() == board[s_row][s_col].get_color():
+                # if so, return false
+                return False
+
+        # check if the move is only 1 square and within 8 legal directions
+        if (e_col, e_row) == (s_col + 1, s_row + 1) or (e_col, e_row) == (s_col - 1, s_row - 1) or \
+                (e_col, e_row) == (s_col + 1, s_row - 1) or (e_col, e_row) == (s_col - 1, s_row + 1) or \
+                (e_col, e_row) == (s_col + 1, s_row) or (e_col, e_row) == (s_col, s_row + 1) or \
+                (e_col, e_row) == (s_col - 1, s_row) or (e_col, e_row) == (s_col, s_row - 1):
+            # if legal, return true
+            return True
+        # otherwise, return false
+        return False
+
+
+class Queen(Piece):
+    '''
+    represents queen
+    '''
+
+    def __init__(self, color, name):
+        super().__init__(color, name)
+        self._num = 1
+
+    def gen_moves(self, sq, board, rules=None):
+        '''
+        gets every square this piece can move to, using the tables precomputed at import
+        :param sq: square index of the piece (row * 8 + col)
+        :param board: current board info
+        :param rules: Variant whose tables to use, STANDARD by default
+        :return: list of end square indices
+        '''
+        return _slide(sq, board, self._color, (rules or STANDARD).queen_lines)
+
+    def check_legal(self, start, end, board):
+        '''
+        checks whether a move is legal
+        :param start: start position
+        :param end: end position
+        :param board: current board info
+        :return: whether the move is legal
+        '''
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
+
+        # store the color of the piece making the move
+        s_color = board[s_row][s_col].get_color()
+        # check whether 'start' and 'end' are out of bound
+        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
+            return False
+        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
+            return False
+        # check when moving diagonally, whether the change in x is the same as the change in y
+        if s_row != e_row and s_col != e_col and abs(s_row - e_row) != abs(s_col - e_col):
+            # if not moving truly 1:1 diagonally, return false
+            return False
+
+        # check the case that the endpoint is already occupied
+        if board[e_row][e_col] != '':
+            # check if the piece is of the same color
+            if board[e_row][e_col].get_color() == s_color:
+                # if so, return false
+                return False
+
+        # scenario when queen is moving straight down
+        if s_col == e_col and s_row < e_row:
+            # keep moving down 1 square at a time to check if there's any piece in the way
+            while s_row < e_row - 1:
+                s_row += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving straight up
+        if s_col == e_col and s_row > e_row:
+            # keep moving up 1 square at a time to check if there's any piece in the way
+            while s_row > e_row + 1:
+                s_row -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving straight right
+        if s_row == e_row and s_col < e_col:
+            # keep moving right 1 square at a time to check if there's any piece in the way
+            while s_col < e_col - 1:
+                s_col += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving straight left
+        if s_row == e_row and s_col > e_col:
+            # keep moving left 1 square at a time to check if there's any piece in the way
+            while s_col > e_col + 1:
+                s_col -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, down and to the left
+        if s_row < e_row and s_col > e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row < e_row - 1 and s_col > e_col + 1:
+                s_row += 1
+                s_col -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, down and to the right
+        if s_row < e_row and s_col < e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row < e_row - 1 and s_col < e_col - 1:
+                s_row += 1
+                s_col += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, up and to the left
+        if s_row > e_row and s_col > e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row > e_row + 1 and s_col > e_col + 1:
+                s_row -= 1
+                s_col -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, up and to the right
+        if s_row > e_row and s_col < e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row > e_row + 1 and s_col < e_col - 1:
+                s_row -= 1
+                s_col += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+        # if nothing goes wrong, return true
+        return True
+
+
+class Pawn(Piece):
+    '''
+    represents pawn
+    '''
+
+    def __init__(self, color, name):
+        super().__init__(color, name)
+        self._num = 8
+
+    def gen_moves(self, sq, board, rules=None):
+        '''
+        gets every square this piece can move to, using the tables precomputed at import
+        :param sq: square index of the piece (row * 8 + col)
+        :param board: current board info
+        :param rules: Variant whose tables to use, STANDARD by default
+        :return: list of end square indices
+        '''
+        rules = rules or STANDARD
+        color = self._color
+        targets = []
+        # moving forward needs an empty square, and 2 squares is only allowed from the starting row
+        e_sq = rules.pawn_push[color][sq]
+        if e_sq >= 0 and board[e_sq >> 3][e_sq & 7] == '':
+            targets.append(e_sq)
+            e_sq = rules.pawn_double[color][sq]
+            if e_sq >= 0 and board[e_sq >> 3][e_sq & 7] == '':
+                targets.append(e_sq)
+        # capturing is 1 square diagonally forward
+        for e_sq in rules.pawn_captures[color][sq]:
+            piece = board[e_sq >> 3][e_sq & 7]
+            if piece != '' and piece.get_color() != color:
+                targets.append(e_sq)
+        return targets
+
+    def check_legal(self, start, end, board):
+        '''
+        checks whether a move is legal
+        :param start: start position
+        :param end: end position
+        :param board: current board info
+        :return: whether the move is legal
+        '''
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
+        # store the color of the piece making the move
+        s_color = board[s_row][s_col].get_color()
+        # check whether 'start' and 'end' are out of bound
+        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
+            return False
+        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
+            return False
+
+        # check the case that the endpoint is already occupied
+        if board[e_row][e_col] != '':
+            # check if the piece is of the same color
+            if board[e_row][e_col].get_color() == s_color:
+                # if so, return false
+                return False
+
+            # otherwise, if the piece in the endpoint is not ours, we are capturing an opponent's piece
+            # when the piece we are moving is black
+            if board[s_row][s_col].get_color() == 'black':
+                # check if moving 1 square diagonally down and either to the left or right
+                if (e_col, e_row) != (s_col + 1, s_row + 1) and (e_col, e_row) != (s_col - 1, s_row + 1):
+                    # if not, return false
+                    return False
+
+            # when the piece we are moving is white
+            if board[s_row][s_col].get_color() == 'white':
+                # check if moving 1 square diagonally up and either to the left or right
+                if (e_col, e_row) != (s_col + 1, s_row - 1) and (e_col, e_row) != (s_col - 1, s_row - 1):
+                    # if not, return false
+                    return False
+
+        # if we are simply moving and not capturing
+        if board[e_row][e_col] == '':
+            # check if we are only moving up and down and not diagonally
+            if s_col != e_col:
+                # if moving side to side, return false
+                return False
+
+            # scenario where we are moving a black piece
+            if board[s_row][s_col].get_color() == 'black':
+                # case where this is the first move
+                if s_row == 1:
+                    # then check if moving forward no more than 2 squares, or if there's not another piece blocking
+                    if e_row <= s_row or e_row > s_row + 2 or board[s_row + 1][s_col] != '':
+                        # return false otherwise
+                        return False
+                # case where this is not the first move
+                else:
+                    # check if only moving 1 square
+                    if e_row != s_row + 1:
+                        # if not, return false
+                        return False
+
+            # scenario where we are moving a white piece
+            if board[s_row][s_col].get_color() == 'white':
+                # case where this is the first move
+                if s_row == 6:
+                    # then check if moving forward no more than 2 squares, or if there's not another piece blocking
+                    if e_row >= s_row or e_row < s_row - 2 or board[s_row - 1][s_col] != '':
+                        # return false otherwise
+                        return False
+                # case where this is not the first move
+                else:
+                    # check if only moving 1 square
+                    if e_row != s_row - 1:
+                        # if not, return false
+                        return False
+        # if nothing goes wrong, return true
+        return True
+
+
+class Rook(Piece):
+    '''
+    represents rook
+    '''
+
+    def __init__(self, color, name):
+        super().__init__(color, name)
+        self._num = 2
+
+    def gen_moves(self, sq, board, rules=None):
+        '''
+        gets every square this piece can move to, using the tables precomputed at import
+        :param sq: square index of the piece (row * 8 + col)
+        :param board: current board info
+        :param rules: Variant whose tables to use, STANDARD by default
+        :return: list of end square indices
+        '''
+        return _slide(sq, board, self._color, (rules or STANDARD).rook_lines)
+
+    def check_legal(self, start, end, board):
+        '''
+        checks whether a move is legal
+        :param start: start position
+        :param end: end position
+        :param board: current board info
+        :return: whether the move is legal
+        '''
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
+        # store the color of the piece making the move
+        s_color = board[s_row][s_col].get_color()
+        # check whether 'start' and 'end' are out of bound
+        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
+            return False
+        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
+            return False
+
+        # check if moving diagonally, which is illegal for rook
+        if s_col != e_col and s_row != e_row:
+            # if so, return false
+            return False
+
+        # check the case that the endpoint is already occupied
+        if board[e_row][e_col] != '':
+            # check if the piece is of the same color
+            if board[e_row][e_col].get_color() == s_color:
+                # if so, return false
+                return False
+
+        # scenario when queen is moving straight down
+        if s_col == e_col and s_row < e_row:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row < e_row - 1:
+                s_row += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving straight up
+        if s_col == e_col and s_row > e_row:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row > e_row + 1:
+                s_row -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving straight right
+        if s_row == e_row and s_col < e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_col < e_col - 1:
+                s_col += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving straight left
+        if s_row == e_row and s_col > e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_col > e_col + 1:
+                s_col -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+        # if nothing goes wrong, return true
+        return True
+
+
+class Bishop(Piece):
+    '''
+    represents bishop
+    '''
+
+    def __init__(self, color, name):
+        super().__init__(color, name)
+        self._num = 2
+
+    def gen_moves(self, sq, board, rules=None):
+        '''
+        gets every square this piece can move to, using the tables precomputed at import
+        :param sq: square index of the piece (row * 8 + col)
+        :param board: current board info
+        :param rules: Variant whose tables to use, STANDARD by default
+        :return: list of end square indices
+        '''
+        return _slide(sq, board, self._color, (rules or STANDARD).bishop_lines)
+
+    def check_legal(self, start, end, board):
+        '''
+        checks whether a move is legal
+        :param start: start position
+        :param end: end position
+        :param board: current board info
+        :return: whether the move is legal
+        '''
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
+        # store the color of the piece making the move
+        s_color = board[s_row][s_col].get_color()
+        # check whether 'start' and 'end' are out of bound
+        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
+            return False
+        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
+            return False
+        # check whether moving purely diagonally, since bishop cannot move any other way
+        if s_col == e_col or s_row == e_row or abs(s_row - e_row) != abs(s_col - e_col):
+            # if not moving diagonally or change in x and y not equal, return false
+            return False
+
+        # check the case that the endpoint is already occupied
+        if board[e_row][e_col] != '':
+            # check if the piece is of the same color
+            if board[e_row][e_col].get_color() == s_color:
+                # if so, return false
+                return False
+
+        # scenario when queen is moving diagonally, down and to the left
+        if s_row < e_row and s_col > e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row < e_row - 1 and s_col > e_col + 1:
+                s_row += 1
+                s_col -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, down and to the right
+        if s_row < e_row and s_col < e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row < e_row - 1 and s_col < e_col - 1:
+                s_row += 1
+                s_col += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, up and to the left
+        if s_row > e_row and s_col > e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row > e_row + 1 and s_col > e_col + 1:
+                s_row -= 1
+                s_col -= 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+
+        # scenario when queen is moving diagonally, up and to the right
+        if s_row > e_row and s_col < e_col:
+            # keep moving 1 square at a time to check if there's any piece in the way
+            while s_row > e_row + 1 and s_col < e_col - 1:
+                s_row -= 1
+                s_col += 1
+                # if there's a piece blocking the path, return false
+                if board[s_row][s_col] != '':
+                    return False
+        # if nothing goes wrong, return true
+        return True
+
+
+class Knight(Piece):
+    '''
+    represents knight
+    '''
+
+    def __init__(self, color, name):
+        super().__init__(color, name)
+        self._num = 2
+
+    def gen_moves(self, sq, board, rules=None):
+        '''
+        gets every square this piece can move to, using the tables precomputed at import
+        :param sq: square index of the piece (row * 8 + col)
+        :param board: current board info
+        :param rules: Variant whose tables to use, STANDARD by default
+        :return: list of end square indices
+        '''
+        return _jump(sq, board, self._color, (rules or STANDARD).knight_jumps)
+
+    def check_legal(self, start, end, board):
+        '''
+        checks whether a move is legal
+        :param start: start position
+        :param end: end position
+        :param board: current board info
+        :return: whether the move is legal
+        '''
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        e_col, e_row = ord(end[0]) - 97, abs(int(end[1]) - 8)
+        # store the color of the piece making the move
+        s_color = board[s_row][s_col].get_color()
+        # check whether 'start' and 'end' are out of bound
+        if s_col < 0 or s_row < 0 or e_col < 0 or e_row < 0:
+            return False
+        if s_col > 7 or s_row > 7 or e_col > 7 or e_row > 7:
+            return False
+
+        # check the case that the endpoint is already occupied
+        if board[e_row][e_col] != '':
+            # check if the piece is of the same color
+            if board[e_row][e_col].get_color() == s_color:
+                # if so, return false
+                return False
+
+        # check if the move is only 1 square and within 8 legal directions
+        if (e_col, e_row) == (s_col + 2, s_row + 1) or (e_col, e_row) == (s_col - 2, s_row - 1) or \
+                (e_col, e_row) == (s_col + 2, s_row - 1) or (e_col, e_row) == (s_col - 2, s_row + 1) or \
+                (e_col, e_row) == (s_col + 1, s_row - 2) or (e_col, e_row) == (s_col + 1, s_row + 2) or \
+                (e_col, e_row) == (s_col - 1, s_row - 2) or (e_col, e_row) == (s_col - 1, s_row + 2):
+            return True
+        # otherwise, return false
+        return False
+
+
+# squares are numbered 0-63 in the same order as the board rows, so a8 is 0, h8 is 7 and h1 is 63
+_SQUARE_NAMES = [chr(97 + col) + str(8 - row) for row in range(8) for col in range(8)]
+_SQUARES = {name: sq for sq, name in enumerate(_SQUARE_NAMES)}
+_BIT = [1 << sq for sq in range(64)]
+
+
+def _jump_masks(offsets):
+    '''
+    builds one bitboard per square holding every square reachable with a single jump
+    :param offsets: (row, col) offsets of the jump
+    :return: list of 64 bitboards
+    '''
+    masks = []
+    for sq in range(64):
+        row, col = sq >> 3, sq & 7
+        mask = 0
+        for d_row, d_col in offsets:
+            if 0 <= row + d_row < 8 and 0 <= col + d_col < 8:
+                mask |= _BIT[(row + d_row) * 8 + col + d_col]
+        masks.append(mask)
+    return masks
+
+
+_KING_ATTACKS = _jump_masks([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+_KNIGHT_ATTACKS = _jump_masks([(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+# pawns only capture forward, which is up the board (towards row 0) for white and down for black
+_PAWN_ATTACKS = {'white': _jump_masks([(-1, -1), (-1, 1)]), 'black': _jump_masks([(1, -1), (1, 1)])}
+
+# for every (start, end) pair, indexed with start * 64 + end: which kind of line joins the two squares
+# ('r' for straight, 'b' for diagonal, '' for none) and the bitboard of the squares strictly between them, also
+# as a tuple of square indices for checking against the 8x8 board
+_LINE = [''] * 4096
+_BETWEEN = [0] * 4096
+_BETWEEN_SQUARES = [()] * 4096
+# for every direction, the bitboard of the full ray leaving each square, and whether the ray runs towards higher
+# square numbers (the first blocker is then the lowest set bit of ray & occupancy, otherwise the highest)
+_ROOK_RAYS = []
+_BISHOP_RAYS = []
+for _d_row, _d_col in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]:
+    _ray = []
+    for _sq in range(64):
+        _row, _col, _path, _path_squares = (_sq >> 3) + _d_row, (_sq & 7) + _d_col, 0, ()
+        while 0 <= _row < 8 and 0 <= _col < 8:
+            _LINE[_sq * 64 + _row * 8 + _col] = 'r' if _d_row == 0 or _d_col == 0 else 'b'
+            _BETWEEN[_sq * 64 + _row * 8 + _col] = _path
+            _BETWEEN_SQUARES[_sq * 64 + _row * 8 + _col] = _path_squares
+            _path |= _BIT[_row * 8 + _col]
+            _path_squares += (_row * 8 + _col,)
+            _row, _col = _row + _d_row, _col + _d_col
+        _ray.append(_path)
+    (_ROOK_RAYS if _d_row == 0 or _d_col == 0 else _BISHOP_RAYS).append((_ray, _d_row * 8 + _d_col > 0))
+del _sq, _d_row, _d_col, _row, _col, _path, _path_squares, _ray
+
+# move tables for every piece except pawns, indexed by piece name and then start * 64 + end: None when the piece
+# can't get from start to end on an empty board, otherwise the bitboard of squares that must be empty in between
+_MOVE_TABLES = {}
+for _kind, _lines, _jumps in [('r', 'r', None), ('b', 'b', None), ('q', 'rb', None),
+                              ('n', '', _KNIGHT_ATTACKS), ('k', '', _KING_ATTACKS)]:
+    _table = [None] * 4096
+    for _i in range(4096):
+        if _jumps is not None:
+            if _jumps[_i >> 6] & _BIT[_i & 63]:
+                _table[_i] = 0
+        elif _LINE[_i] != '' and _LINE[_i] in _lines:
+            _table[_i] = _BETWEEN[_i]
+    _MOVE_TABLES[_kind] = _MOVE_TABLES[_kind.upper()] = _table
+del _kind, _lines, _jumps, _table, _i
+
+
+def _ray_attacks(sq, occ, rays):
+    '''
+    gets every square a sliding piece can reach, stopping each ray at the first blocker (which is included)
+    :param sq: square of the sliding piece
+    :param occ: bitboard of all occupied squares
+    :param rays: _ROOK_RAYS, _BISHOP_RAYS or both
+    :return: bitboard of the reachable squares
+    '''
+    attacks = 0
+    for ray, positive in rays:
+        mask = ray[sq]
+        blockers = mask & occ
+        if blockers:
+            # cut the ray off behind the first blocker
+            mask ^= ray[(blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1]
+        attacks |= mask
+    return attacks
+
+
+def _squares_in(mask, outwards=True):
+    '''
+    lists the squares of a bitboard
+    :param mask: bitboard
+    :param outwards: whether to list them from the lowest square number up
+    :return: list of square indices
+    '''
+    squares = [sq for sq in range(64) if mask & _BIT[sq]]
+    return squares if outwards else squares[::-1]
+
+
+# the same tables as lists of square indices, for walking the board when generating moves: jump lists for the king,
+# knight and pawn captures, and for sliding pieces one list per direction ordered outwards from the start square
+_KING_JUMPS = [_squares_in(mask) for mask in _KING_ATTACKS]
+_KNIGHT_JUMPS = [_squares_in(mask) for mask in _KNIGHT_ATTACKS]
+_PAWN_JUMPS = {color: [_squares_in(mask) for mask in masks] for color, masks in _PAWN_ATTACKS.items()}
+_ROOK_LINES = [[_squares_in(ray[sq], positive) for ray, positive in _ROOK_RAYS] for sq in range(64)]
+_BISHOP_LINES = [[_squares_in(ray[sq], positive) for ray, positive in _BISHOP_RAYS] for sq in range(64)]
+_QUEEN_LINES = [_ROOK_LINES[sq] + _BISHOP_LINES[sq] for sq in range(64)]
+
+
+def _slide(sq, board, color, lines):
+    '''
+    gets every square a sliding piece can move to, walking each line until the first blocker
+    :param sq: square of the sliding piece
+    :param board: current board info
+    :param color: color of the sliding piece
+    :param lines: _ROOK_LINES, _BISHOP_LINES or _QUEEN_LINES
+    :return: list of end square indices
+    '''
+    targets = []
+    for line in lines[sq]:
+        for e_sq in line:
+            piece = board[e_sq >> 3][e_sq & 7]
+            if piece == '':
+                targets.append(e_sq)
+                continue
+            # a blocker of the other color can be captured, but either way the line ends here
+            if piece.get_color() != color:
+                targets.append(e_sq)
+            break
+    return targets
+
+
+def _jump(sq, board, color, jumps):
+    '''
+    gets every square a jumping piece can move to
+    :param sq: square of the jumping piece
+    :param board: current board info
+    :param color: color of the jumping piece
+    :param jumps: _KING_JUMPS or _KNIGHT_JUMPS
+    :return: list of end square indices
+    '''
+    targets = []
+    for e_sq in jumps[sq]:
+        piece = board[e_sq >> 3][e_sq & 7]
+        if piece == '' or piece.get_color() != color:
+            targets.append(e_sq)
+    return targets
+
+# the standard starting position, one string per row from black's side down, as Variant takes it
+_STANDARD_LAYOUT = ['RNBQKBNR', 'PPPPPPPP', '........', '........', '........', '........', 'pppppppp', 'rnbqkbnr']
+
+
+class Variant:
+    '''
+    house rules for the game, compiled once into the tables that move generation and validation read, so a variant
+    plays as fast as the standard game: the board size, the starting layout, how many pieces of a type a side may
+    be left with before it loses, and whether pawns may move 2 squares from their starting row. Boards smaller than
+    8x8 take the top left corner of the 8x8 board, so square indices and the binary formats stay the same. A variant
+    can also end games in a 'DRAW', when a position repeats or after a number of plies
+    '''
+
+    def __init__(self, layout=None, lose_at=None, double_step=True, name='custom', repetitions=0, max_plies=0):
+        '''
+        :param layout: rows from black's side down, all the same length and at most 8 rows of at most 8 squares,
+        with one character per square: a piece name ('RNBQKP' for black, 'rnbqkp' for white) or '.' for empty.
+        The standard starting position by default
+        :param lose_at: dict of piece name -> number of pieces of that type, color included, at which their side
+        has lost; 0 (every one captured) for names not given
+        :param double_step: whether pawns may move 2 squares from the second row on their side
+        :param name: name of the variant
+        :param repetitions: times the same position, with the same player to move, has to come up for the game to
+        be drawn; 0 for never
+        :param max_plies: plies after which an unfinished game is drawn; 0 for no limit
+        '''
+        layout = list(layout or _STANDARD_LAYOUT)
+        height, width = len(layout), len(layout[0]) if layout else 0
+        if not (1 <= height <= 8 and 1 <= width <= 8) or any(len(row) != width for row in layout):
+            raise ValueError('layout must be 1 to 8 rows of the same length, 1 to 8 squares each')
+        if any(char not in '.RNBQKPrnbqkp' for row in layout for char in row):
+            raise ValueError("layout squares must be piece names or '.'")
+        self.name = name
+        self.height = height
+        self.width = width
+        on_board = [sq >> 3 < height and sq & 7 < width for sq in range(64)]
+        # square names count ranks up from the bottom row of the layout, so on a 6 row board a6 is square 0
+        self.names = [chr(97 + (sq & 7)) + str(height - (sq >> 3)) if on_board[sq] else None for sq in range(64)]
+        self.squares = {name: sq for sq, name in enumerate(self.names) if name is not None}
+        # every square on the board by name and by index, for methods that take either
+        self.lookup = dict(self.squares)
+        self.lookup.update((sq, sq) for sq in self.squares.values())
+        # every (start, end) pair of squares, by name or index, -> start * 64 + end, so a move is one dict lookup
+        self.move_codes = {(start, end): s_sq * 64 + e_sq
+                           for start, s_sq in self.lookup.items() for end, e_sq in self.lookup.items()}
+        self.valid_codes = frozenset(self.move_codes.values())
+        # codes with a square off the board, none for the full 8x8 board
+        self.off_codes = [code for code in range(4096) if code not in self.valid_codes]
+        self.board_mask = sum(_BIT[sq] for sq in range(64) if on_board[sq])
+        self.start = [layout[sq >> 3][sq & 7].replace('.', '') if on_board[sq] else '' for sq in range(64)]
+        self.start_occupied = sum(_BIT[sq] for sq in range(64) if self.start[sq] != '')
+        self.lose_at = {name: 0 for name in 'RNBQKPrnbqkp'}
+        for piece_name, count in (lose_at or {}).items():
+            if piece_name not in self.lose_at:
+                raise ValueError(f"unknown piece name {piece_name!r}")
+            self.lose_at[piece_name] = count
+        for piece_name, count in self.lose_at.items():
+            if 0 < self.start.count(piece_name) <= count:
+                raise ValueError(f"the game would start lost: {piece_name!r} starts at or below {count}")
+
+        # the tables every other part of the game reads, cut down to the board; the full 8x8 ones are shared
+        full = height == 8 and width == 8
+        self.king_jumps = _KING_JUMPS if full else [[e for e in jumps if on_board[e]] for jumps in _KING_JUMPS]
+        self.knight_jumps = _KNIGHT_JUMPS if full else [[e for e in jumps if on_board[e]] for jumps in _KNIGHT_JUMPS]
+        self.pawn_captures = _PAWN_JUMPS if full else {
+            color: [[e for e in jumps if on_board[e]] for jumps in tables] for color, tables in _PAWN_JUMPS.items()}
+        # a line leaving the board never comes back onto it, since the board is a rectangle in the corner
+        self.rook_lines, self.bishop_lines, self.queen_lines = (_ROOK_LINES, _BISHOP_LINES, _QUEEN_LINES) if full \
+            else ([[[e for e in line if on_board[e]] for line in lines[sq]] for sq in range(64)]
+                  for lines in (_ROOK_LINES, _BISHOP_LINES, _QUEEN_LINES))
+        self.king_attacks = [mask & self.board_mask for mask in _KING_ATTACKS]
+        self.knight_attacks = [mask & self.board_mask for mask in _KNIGHT_ATTACKS]
+        self.pawn_attacks = {color: [mask & self.board_mask for mask in masks]
+                             for color, masks in _PAWN_ATTACKS.items()}
+        # _MOVE_TABLES with every move leaving the board taken out
+        self.moves = _MOVE_TABLES if full else {
+            name: [between if on_board[i >> 6] and on_board[i & 63] else None for i, between in enumerate(table)]
+            for name, table in _MOVE_TABLES.items()}
+        # the square a pawn moves forward to, and the square 2 ahead when it may move that far, or -1 for none
+        self.pawn_push = {'white': [sq - 8 if on_board[sq] and sq >= 8 else -1 for sq in range(64)],
+                          'black': [sq + 8 if on_board[sq] and sq + 8 < 64 and on_board[sq + 8] else -1
+                                    for sq in range(64)]}
+        double = double_step and height >= 4
+        self.pawn_double = {'white': [sq - 16 if double and on_board[sq] and sq >> 3 == height - 2 else -1
+                                      for sq in range(64)],
+                            'black': [sq + 16 if double and on_board[sq] and sq >> 3 == 1 else -1
+                                      for sq in range(64)]}
+        # the check_legal() methods of the piece classes only know the standard board and pawn rules
+        self.piece_rules = full and double_step
+        if repetitions < 0 or max_plies < 0:
+            raise ValueError('repetitions and max_plies must be 0 or more')
+        self.repetitions = repetitions
+        self.max_plies = max_plies
+        # whether moves have to count positions and plies at all
+        self.draws = repetitions > 0 or max_plies > 0
+
+    def __repr__(self):
+        return f"Variant({self.name!r}, {self.height}x{self.width})"
+
+
+STANDARD = Variant(name='standard')
+
+
+# random numbers for the zobrist position key: one per piece name and square, and one for black to move
+_ZOBRIST_RANDOM = random.Random(20231117)
+_ZOBRIST = {name: [_ZOBRIST_RANDOM.getrandbits(64) for _ in range(64)] for name in 'RNBQKPrnbqkp'}
+_ZOBRIST_TURN = _ZOBRIST_RANDOM.getrandbits(64)
+del _ZOBRIST_RANDOM
+
+
+# 4-bit codes of the pieces in the binary position format, with 0 for an empty square; the piece counts are stored
+# in the same order as the codes
+_CODE_NAMES = ['', 'p', 'n', 'b', 'r', 'q', 'k', 'P', 'N', 'B', 'R', 'Q', 'K', '', '', '']
+_CODES = {name: code for code, name in enumerate(_CODE_NAMES[:13])}
+_COUNT_NAMES = _CODE_NAMES[1:13]
+_STATE_NAMES = ['UNFINISHED', 'WHITE_WON', 'BLACK_WON', 'DRAW']
+_RECORD_SIZE = 40
+# moves made with make_move(), make_move_idx() or make_moves() that are kept to take back: once there are more than
+# _UNDO_LIMIT, only the last _UNDO_KEEP are kept, so a game that is played for a long time doesn't grow forever
+_UNDO_LIMIT = 1024
+_UNDO_KEEP = 512
+
+Snapshot = collections.namedtuple('Snapshot', ['board', 'turn', 'state', 'counts'])
+Snapshot.__doc__ = '''
+immutable, hashable copy of a position made by ChessVar.snapshot(): board is 64 bytes of piece codes in square
+order (a8, b8, ..., h1), turn is the turn counter, state the game state and counts 12 bytes of piece counts in
+_COUNT_NAMES order
+'''
+
+
+# reasons check_move() gives for rejecting a move
+BAD_SQUARE = 'BAD_SQUARE'
+GAME_OVER = 'GAME_OVER'
+NO_PIECE = 'NO_PIECE'
+WRONG_TURN = 'WRONG_TURN'
+ILLEGAL_MOVE = 'ILLEGAL_MOVE'
+
+
+class Metrics:
+    '''
+    counters and timers for the hot paths of every game in the process: moves by outcome, move checks and their
+    time by the class of the piece moved, and engine searches. Nothing is counted unless enable_metrics() has been
+    called, which swaps counting versions of the methods involved into the classes; until then the hot paths are
+    the plain ones and pay nothing at all. The counting versions check moves the same way as the plain ones, with
+    _check_idx(), so the checks counted are the ones make_move(), make_move_idx() and make_moves() really run
+    '''
+
+    def __init__(self):
+        # moves asked for with make_move(), make_move_idx() or make_moves(), by 'accepted' or the rejection reason
+        self._moves = {}
+        # [checks, seconds] of _check_idx() by the class name of the piece on the start square, 'None' if it is empty
+        self._checks = {}
+        self._search = {'searches': 0, 'nodes': 0, 'seconds': 0.0}
+
+    def count_moves(self, accepted, reason):
+        '''
+        counts moves made and the one rejected after them, if any
+        :param accepted: number of moves made
+        :param reason: None, or why the next move was rejected
+        :return: nothing
+        '''
+        if accepted:
+            self._moves['accepted'] = self._moves.get('accepted', 0) + accepted
+        if reason is not None:
+            self._moves[reason] = self._moves.get(reason, 0) + 1
+
+    def count_check(self, piece_class, seconds):
+        '''
+        counts one move check
+        :param piece_class: name of the class of the piece moved, e.g. 'Pawn'
+        :param seconds: time it took
+        :return: nothing
+        '''
+        timing = self._checks.get(piece_class)
+        if timing is None:
+            timing = self._checks[piece_class] = [0, 0.0]
+        timing[0] += 1
+        timing[1] += seconds
+
+    def count_search(self, nodes, seconds):
+        '''
+        counts one engine search
+        :param nodes: nodes it searched
+        :param seconds: time it took
+        :return: nothing
+        '''
+        self._search['searches'] += 1
+        self._search['nodes'] += nodes
+        self._search['seconds'] += seconds
+
+    def snapshot(self):
+        '''
+        copies every counter
+        :return: dict with moves ({outcome: count}), checks ({piece class: {'calls', 'seconds'}}) and search
+        ({'searches', 'nodes', 'seconds'})
+        '''
+        return {
+            'moves': dict(self._moves),
+            'checks': {name: {'calls': calls, 'seconds': seconds}
+                            for name, (calls, seconds) in self._checks.items()},
+            'search': dict(self._search),
+        }
+
+    def to_prometheus(self):
+        '''
+        formats every counter in the Prometheus text exposition format
+        :return: text ending in a newline
+        '''
+        lines = ['# HELP chessvar_moves_total Moves asked for, by outcome.',
+                 '# TYPE chessvar_moves_total counter']
+        lines += [f'chessvar_moves_total{{outcome="{outcome}"}} {count}'
+                  for outcome, count in sorted(self._moves.items())]
+        lines += ['# HELP chessvar_move_checks_total Moves checked, by class of the piece moved.',
+                  '# TYPE chessvar_move_checks_total counter']
+        lines += [f'chessvar_move_checks_total{{piece="{name}"}} {calls}'
+                  for name, (calls, _) in sorted(self._checks.items())]
+        lines += ['# HELP chessvar_move_check_seconds_total Time spent checking moves, by class of the piece moved.',
+                  '# TYPE chessvar_move_check_seconds_total counter']
+        lines += [f'chessvar_move_check_seconds_total{{piece="{name}"}} {seconds:.9f}'
+                  for name, (_, seconds) in sorted(self._checks.items())]
+        for name, help_text in [('searches', 'Engine searches.'), ('nodes', 'Nodes searched by the engine.'),
+                                ('seconds', 'Time spent searching.')]:
+            metric = 'chessvar_search_total' if name == 'searches' else f'chessvar_search_{name}_total'
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter',
+                      f'{metric} {self._search[name]}']
+        return '\n'.join(lines) + '\n'
+
+
+# the Metrics being counted into, or None while metrics are off
+_metrics = None
+
+
+def enable_metrics():
+    '''
+    starts counting, keeping the counters already there if metrics were on
+    :return: Metrics
+    '''
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+        for cls, name, method in _METERED:
+            setattr(cls, name, method)
+    return _metrics
+
+
+def disable_metrics():
+    '''
+    stops counting and drops the counters
+    :return: nothing
+    '''
+    global _metrics
+    if _metrics is not None:
+        for cls, name, _ in _METERED:
+            setattr(cls, name, _PLAIN_METHODS[cls, name])
+    _metrics = None
+
+
+def get_metrics():
+    '''
+    gets the counters
+    :return: Metrics, or None if metrics are off
+    '''
+    return _metrics
+
+
+def _attack_mask(sq, piece, occ):
+    '''
+    gets the squares a piece attacks, i.e. could capture on, whether or not they are empty or hold its own pieces
+    :param sq: square of the piece
+    :param piece: the piece, or '' for none
+    :param occ: bitboard of all occupied squares
+    :return: bitboard of the attacked squares
+    '''
+    if piece == '':
+        return 0
+    name = piece.get_name().lower()
+    if name == 'p':
+        return _PAWN_ATTACKS[piece.get_color()][sq]
+    if name == 'n':
+        return _KNIGHT_ATTACKS[sq]
+    if name == 'k':
+        return _KING_ATTACKS[sq]
+    return _ray_attacks(sq, occ, _ROOK_RAYS if name == 'r' else _BISHOP_RAYS if name == 'b'
+                        else _ROOK_RAYS + _BISHOP_RAYS)
+
+
+class _AttackMaps:
+    '''
+    which squares every piece attacks and, the other way around, which squares every square is attacked from, kept
+    up to date one move at a time: a move only changes the attacks of the pieces on its two squares and of the
+    sliding pieces whose lines ran through them
+    '''
+
+    def __init__(self, board):
+        '''
+        :param board: board to build the maps from
+        '''
+        # the piece on each square as of the last update, the bitboard of each piece name, and of each color
+        self._pieces = [board[sq >> 3][sq & 7] for sq in range(64)]
+        self._where = {name: 0 for name in 'RNBQKPrnbqkp'}
+        self._occ = {'white': 0, 'black': 0}
+        for sq in range(64):
+            piece = self._pieces[sq]
+            if piece != '':
+                self._where[piece.get_name()] |= _BIT[sq]
+                self._occ[piece.get_color()] |= _BIT[sq]
+        # squares attacked by the piece on each square, and squares holding a piece that attacks each square
+        self._from = [0] * 64
+        self._to = [0] * 64
+        occ = self._occ['white'] | self._occ['black']
+        for sq in range(64):
+            self._set(sq, _attack_mask(sq, board[sq >> 3][sq & 7], occ))
+
+    def _set(self, sq, mask):
+        '''
+        replaces the attacks of the piece on sq, updating the squares that gained or lost it as an attacker
+        :param sq: square of the piece
+        :param mask: its new attacks
+        :return: nothing
+        '''
+        old = self._from[sq]
+        self._from[sq] = mask
+        bit = _BIT[sq]
+        lost, gained = old & ~mask, mask & ~old
+        while lost:
+            low = lost & -lost
+            self._to[low.bit_length() - 1] ^= bit
+            lost ^= low
+        while gained:
+            low = gained & -gained
+            self._to[low.bit_length() - 1] |= bit
+            gained ^= low
+
+    def update(self, board, s_sq, e_sq):
+        '''
+        brings the maps up to date after the pieces on two squares changed, either by a move or by taking one back
+        :param board: board after the change
+        :param s_sq: one square that changed
+        :param e_sq: the other square that changed
+        :return: nothing
+        '''
+        # sliding pieces that saw either square, taken before the maps change
+        seen = (self._to[s_sq] | self._to[e_sq]) & ~(_BIT[s_sq] | _BIT[e_sq])
+        for sq in (s_sq, e_sq):
+            old, piece = self._pieces[sq], board[sq >> 3][sq & 7]
+            if old != '':
+                self._where[old.get_name()] ^= _BIT[sq]
+                self._occ[old.get_color()] ^= _BIT[sq]
+            if piece != '':
+                self._where[piece.get_name()] |= _BIT[sq]
+                self._occ[piece.get_color()] |= _BIT[sq]
+            self._pieces[sq] = piece
+        occ = self._occ['white'] | self._occ['black']
+        self._set(s_sq, _attack_mask(s_sq, board[s_sq >> 3][s_sq & 7], occ))
+        self._set(e_sq, _attack_mask(e_sq, board[e_sq >> 3][e_sq & 7], occ))
+        while seen:
+            low = seen & -seen
+            sq = low.bit_length() - 1
+            piece = self._pieces[sq]
+            if piece.get_name() in 'RBQrbq':
+                self._set(sq, _attack_mask(sq, piece, occ))
+            seen ^= low
+
+    def get_map(self, color):
+        '''
+        gets every square attacked by one color
+        :param color: 'white' or 'black'
+        :return: bitboard
+        '''
+        attacked = 0
+        pieces = self._occ[color]
+        while pieces:
+            low = pieces & -pieces
+            attacked |= self._from[low.bit_length() - 1]
+            pieces ^= low
+        return attacked
+
+    def attacked_by(self, sq, color):
+        '''
+        checks whether a square is attacked by one color
+        :param sq: square index
+        :param color: 'white' or 'black'
+        :return: bitboard of the squares of that color's pieces attacking sq, 0 if none
+        '''
+        return self._to[sq] & self._occ[color]
+
+
+class TranspositionTable:
+    '''
+    fixed-size table of search results keyed by ChessVar position keys; the memory is allocated up front, so the
+    table can be shared by several engines or analysis tools without growing
+    '''
+
+    # kinds of stored score: exact, or a bound from an alpha-beta cutoff
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, size=1 << 20):
+        '''
+        :param size: number of entries, rounded up to a power of 2
+        '''
+        self._size = 1
+        while self._size < size:
+            self._size *= 2
+        self._mask = self._size - 1
+        # one array per field, so an entry costs 17 bytes
+        self._keys = array('Q', bytes(8 * self._size))
+        self._depths = array('b', [-1]) * self._size
+        self._scores = array('i', bytes(4 * self._size))
+        self._flags = array('B', bytes(self._size))
+        self._moves = array('H', bytes(2 * self._size))
+        self._age = 0
+        self._ages = array('B', bytes(self._size))
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+
+    def new_search(self):
+        '''
+        marks the start of a new search, so entries from earlier searches can be replaced by shallower ones
+        :return: nothing
+        '''
+        self._age = (self._age + 1) & 255
+
+    def probe(self, key):
+        '''
+        looks up a position
+        :param key: position key from ChessVar.get_key()
+        :return: (depth, score, flag, move) with move a (start, end) square index pair or None, or None if the
+        position isn't stored
+        '''
+        i = key & self._mask
+        if self._depths[i] < 0 or self._keys[i] != key:
+            self._misses += 1
+            return None
+        self._hits += 1
+        move = self._moves[i]
+        return self._depths[i], self._scores[i], self._flags[i], (move >> 6 & 63, move & 63) if move else None
+
+    def store(self, key, depth, score, flag, move=None):
+        '''
+        stores a search result, keeping the deeper result when two positions share a slot
+        :param key: position key from ChessVar.get_key()
+        :param depth: depth searched, 0 to 127
+        :param score: score of the position
+        :param flag: EXACT, LOWER or UPPER
+        :param move: best move as a (start, end) square index pair, or None
+        :return: whether the result was stored
+        '''
+        i = key & self._mask
+        if self._depths[i] >= 0 and self._keys[i] != key and self._ages[i] == self._age and depth < self._depths[i]:
+            return False
+        self._keys[i] = key
+        self._depths[i] = depth
+        self._scores[i] = score
+        self._flags[i] = flag
+        # squares are stored as one number with bit 12 set, so 0 can mean no move
+        self._moves[i] = (move[0] * 64 + move[1] + 4096) if move is not None else 0
+        self._ages[i] = self._age
+        self._stores += 1
+        return True
+
+    def clear(self):
+        '''
+        empties the table and resets the counters
+        :return: nothing
+        '''
+        self.__init__(self._size)
+
+    def get_stats(self):
+        '''
+        gets the counters of the table
+        :return: dict with the size and the number of hits, misses and stores
+        '''
+        return {'size': self._size, 'hits': self._hits, 'misses': self._misses, 'stores': self._stores}
+
+
+# a side loses when any of its counts reaches 0, so the fewer pieces of a type are left the more each one is worth;
+# _DANGER[n] is how weak a side is with n pieces of a type left (a missing type can't be captured, so it costs 0)
+_DANGER = [0, 400, 150, 70, 40, 25, 16, 10, 6]
+_WIN_SCORE = 100000
+# scores this close to _WIN_SCORE are wins found by the search, stored relative to the node in the table
+_WIN_BOUND = _WIN_SCORE - 1000
+
+
+# how much capturing a piece is worth, by the number of its type left above the count at which its side loses:
+# _WIN_SCORE for the last one, otherwise what losing it adds to the danger
+_CAPTURE_VALUES = [_WIN_SCORE, _WIN_SCORE] + [_DANGER[min(num, 8) - 1] - _DANGER[min(num, 8)] for num in range(2, 65)]
+# _DANGER for any number of pieces
+_DANGERS = [_DANGER[min(num, 8)] for num in range(65)]
+
+
+def _piece_bitboards(board):
+    '''
+    gets the bitboard of every piece name from the board, for static exchange evaluation
+    :param board: current board info
+    :return: dict of piece name -> bitboard
+    '''
+    where = dict.fromkeys('RNBQKPrnbqkp', 0)
+    for sq in range(64):
+        piece = board[sq >> 3][sq & 7]
+        if piece != '':
+            where[piece.get_name()] |= _BIT[sq]
+    return where
+
+
+def _attackers(sq, occ, where):
+    '''
+    gets every piece of either color attacking a square, looking through the squares missing from occ, so a slider
+    behind a piece that has already captured joins in (an X-ray attacker)
+    :param sq: the square
+    :param occ: bitboard of the squares still occupied
+    :param where: dict of piece name -> bitboard
+    :return: bitboard of the attackers
+    '''
+    straight = where['r'] | where['R'] | where['q'] | where['Q']
+    diagonal = where['b'] | where['B'] | where['q'] | where['Q']
+    # a white pawn attacks sq from where a black pawn on sq would attack, and the other way round
+    attackers = (_PAWN_ATTACKS['black'][sq] & where['p']) | (_PAWN_ATTACKS['white'][sq] & where['P']) | \
+        (_KNIGHT_ATTACKS[sq] & (where['n'] | where['N'])) | (_KING_ATTACKS[sq] & (where['k'] | where['K']))
+    if straight:
+        attackers |= _ray_attacks(sq, occ, _ROOK_RAYS) & straight
+    if diagonal:
+        attackers |= _ray_attacks(sq, occ, _BISHOP_RAYS) & diagonal
+    return attackers & occ
+
+
+def _see(board, s_sq, e_sq, where, left):
+    '''
+    static exchange evaluation: plays out the captures on e_sq that follow the move from s_sq, each side always
+    capturing with the piece whose loss costs it least and free to stop when going on would lose more. A capture
+    that brings a type down to its losing count ends the exchange, and the game
+    :param board: current board info
+    :param s_sq: start square of the move
+    :param e_sq: end square, which may be empty
+    :param where: dict of piece name -> bitboard, from _piece_bitboards()
+    :param left: dict of piece name -> pieces left above the count at which its side loses; not changed
+    :return: what the move gains for the side making it, in the same units as _CAPTURE_VALUES, so _WIN_SCORE when
+    it wins the game and about -_WIN_SCORE when it loses it
+    '''
+    victim = board[e_sq >> 3][e_sq & 7]
+    on_square = board[s_sq >> 3][s_sq & 7].get_name()
+    gains = [0]
+    left = dict(left)
+    if victim != '':
+        name = victim.get_name()
+        if left[name] <= 1:
+            return _WIN_SCORE
+        gains[0] = _CAPTURE_VALUES[left[name]]
+        left[name] -= 1
+    occ = 0
+    for bits in where.values():
+        occ |= bits
+    occ &= ~_BIT[s_sq]
+    side = 'PNBRQK' if on_square.islower() else 'pnbrqk'
+    while True:
+        attackers = _attackers(e_sq, occ, where)
+        # the least valuable attacker of the side to capture
+        best, best_cost = None, None
+        for name in side:
+            bits = attackers & where[name]
+            if bits:
+                cost = _CAPTURE_VALUES[left[name]]
+                if best is None or cost < best_cost:
+                    best, best_cost, best_bit = name, cost, bits & -bits
+        if best is None:
+            break
+        value = _CAPTURE_VALUES[left[on_square]]
+        gains.append(value - gains[-1])
+        if value == _WIN_SCORE:
+            # the capture ends the game, so nothing comes after it
+            break
+        left[on_square] -= 1
+        on_square = best
+        occ &= ~best_bit
+        side = 'PNBRQK' if side == 'pnbrqk' else 'pnbrqk'
+    # either side can stop capturing, so go back through the exchange keeping the better choice at every step
+    for depth in range(len(gains) - 1, 0, -1):
+        gains[depth - 1] = -max(-gains[depth - 1], gains[depth])
+    return gains[0]
+
+
+class _SearchTimeout(Exception):
+    '''
+    raised inside the search when the time budget runs out
+    '''
+
+
+class _Search:
+    '''
+    iterative deepening alpha-beta search over a ChessVar position, using push/pop to walk the tree
+    '''
+
+    def __init__(self, game, tt, deadline):
+        self._game = game
+        self._tt = tt
+        self._deadline = deadline
+        self._lose_at = game._rules.lose_at
+        # the bitboard of every piece name, kept up to date move by move for static exchange evaluation
+        self._where = dict(game._get_where())
+        # every piece of each color with its variant's lose_at count, for the evaluation
+        self._white = [(piece, self._lose_at[piece.get_name()]) for piece in (game._r, game._n, game._b, game._q,
+                                                                               game._k, game._p)]
+        self._black = [(piece, self._lose_at[piece.get_name()]) for piece in (game._R, game._N, game._B, game._Q,
+                                                                               game._K, game._P)]
+        self._nodes = 0
+        # two killer moves per ply and a history score per (start, end) pair for ordering quiet moves
+        self._killers = [[None, None] for _ in range(128)]
+        self._history = [0] * 4096
+        self._pv = [[] for _ in range(129)]
+
+    def _evaluate(self):
+        '''
+        scores the position for the player whose turn it is by comparing how close each side is to losing a type
+        :return: score, positive when the player to move is better off
+        '''
+        # a type is as close to losing as the pieces it has above the variant's lose_at count
+        white = 0
+        for piece, lose_at in self._white:
+            white += _DANGERS[piece.get_num() - lose_at]
+        black = 0
+        for piece, lose_at in self._black:
+            black += _DANGERS[piece.get_num() - lose_at]
+        return black - white if self._game._turn % 2 == 0 else white - black
+
+    def _order(self, moves, tt_move, ply, prune=False):
+        '''
+        sorts moves so that the table move comes first, then captures by most valuable victim and least valuable
+        attacker, then killer moves, then quiet moves by history score, then captures that lose the exchange
+        :param moves: list of (start, end) square index pairs
+        :param tt_move: best move stored in the transposition table, or None
+        :param ply: distance from the root
+        :param prune: whether to drop the captures that lose the exchange instead
+        :return: nothing
+        '''
+        game = self._game
+        board = game._board
+        killers = self._killers[ply]
+        history = self._history
+        lose_at = self._lose_at
+        where = self._where
+        # the counts every exchange starts from, only gathered once there is an exchange to evaluate
+        left = None
+        losing = set()
+
+        def key(move):
+            nonlocal left
+            if move == tt_move:
+                return -1 << 40
+            victim = board[move[1] >> 3][move[1] & 7]
+            if victim != '':
+                attacker = board[move[0] >> 3][move[0] & 7]
+                value = _CAPTURE_VALUES[victim.get_num() - lose_at[victim.get_name()]]
+                cost = _CAPTURE_VALUES[attacker.get_num() - lose_at[attacker.get_name()]]
+                # only a capture by a piece worth more than its victim can lose the exchange
+                if cost > value:
+                    if left is None:
+                        left = game._get_left()
+                    see = _see(board, move[0], move[1], where, left)
+                    if see < 0:
+                        losing.add(move)
+                        return -(1 << 19) - see
+                return -(1 << 30) - value * 1024 + min(cost, 1000)
+            if move == killers[0] or move == killers[1]:
+                return -(1 << 20)
+            return -history[move[0] * 64 + move[1]]
+        moves.sort(key=key)
+        if prune and losing:
+            moves[:] = [move for move in moves if move not in losing]
+
+    def _make(self, move):
+        '''
+        makes a move in the game and on the bitboards
+        :param move: (start, end) square index pair
+        :return: nothing
+        '''
+        s_sq, e_sq = move
+        board = self._game._board
+        victim = board[e_sq >> 3][e_sq & 7]
+        if victim != '':
+            self._where[victim.get_name()] ^= _BIT[e_sq]
+        self._where[board[s_sq >> 3][s_sq & 7].get_name()] ^= _BIT[s_sq] | _BIT[e_sq]
+        self._game._push(s_sq, e_sq)
+
+    def _unmake(self):
+        '''
+        takes back the last move in the game and on the bitboards
+        :return: nothing
+        '''
+        game = self._game
+        s_sq, e_sq = game._pop()
+        victim = game._board[e_sq >> 3][e_sq & 7]
+        if victim != '':
+            self._where[victim.get_name()] ^= _BIT[e_sq]
+        self._where[game._board[s_sq >> 3][s_sq & 7].get_name()] ^= _BIT[s_sq] | _BIT[e_sq]
+
+    def _tick(self):
+        '''
+        counts a node and stops the search when the time is up
+        :return: nothing
+        '''
+        self._nodes += 1
+        if self._nodes & 63 == 0 and self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _SearchTimeout
+
+    def _quiesce(self, alpha, beta, ply):
+        '''
+        searches only captures until the position is quiet, so the score isn't taken in the middle of an exchange
+        :return: score for the player to move
+        '''
+        self._tick()
+        game = self._game
+        if game._state != 'UNFINISHED':
+            # the last move either drew the game or captured the last piece of a type
+            return 0 if game._state == 'DRAW' else -(_WIN_SCORE - ply)
+        best = self._evaluate()
+        if best >= beta or ply >= 127:
+            return best
+        alpha = max(alpha, best)
+        board = game._board
+        captures = [move for move in game._gen_moves() if board[move[1] >> 3][move[1] & 7] != '']
+        # captures that lose the exchange are left out, as they can't raise the score
+        self._order(captures, None, ply, prune=True)
+        for move in captures:
+            self._make(move)
+            score = -self._quiesce(-beta, -alpha, ply + 1)
+            self._unmake()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def _negamax(self, depth, alpha, beta, ply):
+        '''
+        alpha-beta search to a fixed depth
+        :return: score for the player to move
+        '''
+        self._tick()
+        game = self._game
+        self._pv[ply] = []
+        if game._state != 'UNFINISHED':
+            return 0 if game._state == 'DRAW' else -(_WIN_SCORE - ply)
+        if depth <= 0:
+            return self._quiesce(alpha, beta, ply)
+
+        key = game._key
+        entry = self._tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_depth, score, flag, tt_move = entry
+            if ply > 0 and tt_depth >= depth:
+                # wins are stored relative to the node, so make them relative to the root again
+                if score > _WIN_BOUND:
+                    score -= ply
+                elif score < -_WIN_BOUND:
+                    score += ply
+                if flag == TranspositionTable.EXACT or \
+                        (flag == TranspositionTable.LOWER and score >= beta) or \
+                        (flag == TranspositionTable.UPPER and score <= alpha):
+                    return score
+
+        moves = game._gen_moves()
+        if not moves:
+            # no legal move, which the rules treat as neither side winning
+            return 0
+        self._order(moves, tt_move, ply)
+        board = game._board
+        alpha_start = alpha
+        best, best_move = -_WIN_SCORE - 1, None
+        for move in moves:
+            self._make(move)
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            self._unmake()
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        if board[move[1] >> 3][move[1] & 7] == '':
+                            killers = self._killers[ply]
+                            if killers[0] != move:
+                                killers[1], killers[0] = killers[0], move
+                            self._history[move[0] * 64 + move[1]] += depth * depth
+                        break
+
+        flag = TranspositionTable.UPPER if best <= alpha_start else \
+            TranspositionTable.LOWER if best >= beta else TranspositionTable.EXACT
+        stored = best + ply if best > _WIN_BOUND else best - ply if best < -_WIN_BOUND else best
+        self._tt.store(key, min(depth, 127), stored, flag, best_move)
+        return best
+
+    def run(self, max_depth, start_time):
+        '''
+        searches 1 ply deeper at a time until max_depth or the deadline
+        :param max_depth: deepest iteration to run
+        :param start_time: time.perf_counter() when the search was asked for
+        :return: dict with the best move as a (start, end) square index pair, score, depth, pv and node count
+        '''
+        game = self._game
+        root_moves = game._gen_moves()
+        info = {'move': root_moves[0] if root_moves else None, 'score': 0, 'depth': 0, 'pv': []}
+        undo_size = len(game._undo)
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(depth, -_WIN_SCORE - 1, _WIN_SCORE + 1, 0)
+            except _SearchTimeout:
+                # put the position back the way it was at the root
+                while len(game._undo) > undo_size:
+                    game._pop()
+                break
+            if self._pv[0]:
+                info.update(move=self._pv[0][0], score=score, depth=depth, pv=self._pv[0])
+            # a forced win or loss won't change by searching deeper
+            if abs(score) > _WIN_BOUND:
+                break
+            # an iteration takes several times longer than the one before, so don't start one that can't finish
+            if self._deadline is not None and \
+                    time.perf_counter() - start_time > (self._deadline - start_time) / 2:
+                break
+        info['nodes'] = self._nodes
+        return info
+
+
+class ChessVar:
+    '''
+    main class that represents the game
+    '''
+
+    def __init__(self, variant=None):
+        '''
+        :param variant: Variant to play, STANDARD by default
+        '''
+        self._R = Rook('black', 'R')
+        self._N = Knight('black', 'N')
+        self._B = Bishop('black', 'B')
+        self._Q = Queen('black', 'Q')
+        self._K = King('black', 'K')
+        self._P = Pawn('black', 'P')
+
+        self._r = Rook('white', 'r')
+        self._n = Knight('white', 'n')
+        self._b = Bishop('white', 'b')
+        self._q = Queen('white', 'q')
+        self._k = King('white', 'k')
+        self._p = Pawn('white', 'p')
+        # every piece by name, for setting up positions
+        self._pieces = {piece.get_name(): piece for piece in (self._R, self._N, self._B, self._Q, self._K, self._P,
+                                                               self._r, self._n, self._b, self._q, self._k, self._p)}
+
+        self._turn = 0
+        self._state = 'UNFINISHED'
+        # one (start, end, captured piece, previous state, previous key) entry per move, for pop()
+        self._undo = []
+
+        self._board = [
+            [self._R, self._N, self._B, self._Q, self._K, self._B, self._N, self._R],
+            [self._P] * 8,
+            [''] * 8,
+            [''] * 8,
+            [''] * 8,
+            [''] * 8,
+            [self._p] * 8,
+            [self._r, self._n, self._b, self._q, self._k, self._b, self._n, self._r]
+        ]
+        # zobrist key of the position, updated by every move
+        self._key = self._compute_key()
+        # transposition table and details of the last best_move() search
+        self._tt = None
+        self._search_info = None
+        # _AttackMaps, built by the first attack query and then kept up to date by every move
+        self._attacks = None
+        # the compiled rules; any other variant replaces the standard layout above with its own
+        self._rules = variant if variant is not None else STANDARD
+        # how many times every position has come up, by key, for variants that draw on repetition
+        self._seen = {self._key: 1}
+        if variant is not None:
+            self._load(variant.start, 0, 'UNFINISHED')
+
+    def _load(self, names, turn, state, counts=None):
+        '''
+        sets up a position, replacing whatever is on the board
+        :param names: 64 piece names in square order (a8, b8, ..., h1), '' for an empty square
+        :param turn: turn counter, even when it is white's turn
+        :param state: 'UNFINISHED', 'WHITE_WON', 'BLACK_WON' or 'DRAW'
+        :param counts: number of pieces left by piece name, counted from the board by default
+        :return: nothing
+        '''
+        pieces = self._pieces
+        self._board = [[pieces[name] if name != '' else '' for name in names[row * 8:row * 8 + 8]]
+                       for row in range(8)]
+        for name, piece in pieces.items():
+            piece.update_num(counts[name] if counts is not None else names.count(name))
+        self._turn = turn
+        self._state = state
+        self._undo = []
+        # the key straight from the names, which is quicker than reading every piece back off the board
+        key = _ZOBRIST_TURN if turn % 2 == 1 else 0
+        for sq, name in enumerate(names):
+            if name != '':
+                key ^= _ZOBRIST[name][sq]
+        self._key = key
+        # the moves that led here are unknown, so repetitions count from this position
+        self._seen = {self._key: 1}
+        self._search_info = None
+        self._attacks = None
+
+    def to_bytes(self):
+        '''
+        encodes the position in _RECORD_SIZE bytes: 4 bits per square, then a byte with the side to move (bit 0)
+        and the state (bits 1-2), then 4 bits per piece count in _COUNT_NAMES order, then a spare byte. Raises
+        ValueError for a position with more than 15 pieces of a type, such as a variant's layout can have, since
+        the count wouldn't fit in its 4 bits
+        :return: bytes
+        '''
+        pending = self.__dict__.get('_pending_snapshot')
+        if pending is not None:
+            # an unused fork is encoded straight from its snapshot, without being set up
+            codes, counts, turn, state = pending.board, list(pending.counts), pending.turn, pending.state
+        else:
+            codes = [_CODES[piece.get_name()] if piece != '' else 0 for row in self._board for piece in row]
+            counts = [self._pieces[name].get_num() for name in _COUNT_NAMES]
+            turn, state = self._turn, self._state
+        if max(counts) > 15:
+            name = _COUNT_NAMES[counts.index(max(counts))]
+            raise ValueError(f"{max(counts)} pieces named {name!r}: to_bytes() keeps at most 15 of a type")
+        data = bytearray(_RECORD_SIZE)
+        for i in range(32):
+            data[i] = codes[2 * i] | codes[2 * i + 1] << 4
+        data[32] = turn % 2 | _STATE_NAMES.index(state) << 1
+        for i in range(6):
+            data[33 + i] = counts[2 * i] | counts[2 * i + 1] << 4
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data, variant=None):
+        '''
+        decodes a position made by to_bytes(); the turn counter only keeps whose turn it is
+        :param data: bytes-like object of at least _RECORD_SIZE bytes
+        :param variant: Variant the position was played under, STANDARD by default
+        :return: new game at that position
+        '''
+        game = cls(variant)
+        names = []
+        for i in range(32):
+            names.append(_CODE_NAMES[data[i] & 15])
+            names.append(_CODE_NAMES[data[i] >> 4])
+        counts = {}
+        for i in range(6):
+            counts[_COUNT_NAMES[2 * i]] = data[33 + i] & 15
+            counts[_COUNT_NAMES[2 * i + 1]] = data[33 + i] >> 4
+        game._load(names, data[32] & 1, _STATE_NAMES[data[32] >> 1 & 3], counts)
+        return game
+
+    def snapshot(self):
+        '''
+        copies the position into a Snapshot, which can be kept, compared, hashed or used as a dict key; the moves
+        that led to it aren't kept
+        :return: Snapshot
+        '''
+        # a fork that hasn't been used yet already has one
+        pending = self.__dict__.get('_pending_snapshot')
+        if pending is not None:
+            return pending
+        board = bytes([_CODES[piece.get_name()] if piece != '' else 0 for row in self._board for piece in row])
+        counts = bytes([self._pieces[name].get_num() for name in _COUNT_NAMES])
+        return Snapshot(board, self._turn, self._state, counts)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, variant=None):
+        '''
+        makes a game at the position of a snapshot
+        :param snapshot: Snapshot made by snapshot()
+        :param variant: Variant the position was played under, STANDARD by default
+        :return: new game, with nothing to pop()
+        '''
+        game = cls(variant)
+        game._load_snapshot(snapshot)
+        return game
+
+    def _load_snapshot(self, snapshot):
+        '''
+        sets up the position of a snapshot
+        :param snapshot: Snapshot
+        :return: nothing
+        '''
+        self._load([_CODE_NAMES[code] for code in snapshot.board], snapshot.turn, snapshot.state,
+                   dict(zip(_COUNT_NAMES, snapshot.counts)))
+
+    def fork(self):
+        '''
+        branches the game: the fork starts at the current position and the two games can then move independently.
+        The fork only holds a snapshot, which answers snapshot(), to_bytes(), get_key() and get_game_state(), so
+        keeping thousands of them is cheap; it is set up as a full game the first time it is moved or anything
+        else is asked of it, such as its legal moves
+        :return: new game of the same class, with nothing to pop()
+        '''
+        fork = self.__class__.__new__(self.__class__)
+        fork._pending_snapshot = self.snapshot()
+        # only another variant needs carrying over; read without setting this game up, in case it is an unused fork
+        rules = self.__dict__.get('_pending_rules') if '_pending_snapshot' in self.__dict__ else self._rules
+        if rules is not None and rules is not STANDARD:
+            fork._pending_rules = rules
+        return fork
+
+    def __getattr__(self, name):
+        '''
+        only called for attributes that don't exist, which for a fork means it hasn't been set up yet: sets it up
+        from its snapshot and then looks the attribute up again
+        '''
+        # special methods such as __setstate__ are looked up on purpose and must not set the game up
+        if name.startswith('__') or '_pending_snapshot' not in self.__dict__:
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+        pending = self.__dict__.pop('_pending_snapshot')
+        self.__init__(self.__dict__.pop('_pending_rules', None))
+        self._load_snapshot(pending)
+        return getattr(self, name)
+
+    def _compute_key(self):
+        '''
+        computes the zobrist key of the current position from scratch
+        :return: 64-bit position key
+        '''
+        key = _ZOBRIST_TURN if self._turn % 2 == 1 else 0
+        for sq in range(64):
+            piece = self._board[sq >> 3][sq & 7]
+            if piece != '':
+                key ^= _ZOBRIST[piece.get_name()][sq]
+        return key
+
+    def get_key(self):
+        '''
+        gets the zobrist key of the current position, which covers where every piece is and whose turn it is
+        :return: 64-bit position key
+        '''
+        pending = self.__dict__.get('_pending_snapshot')
+        if pending is not None:
+            key = _ZOBRIST_TURN if pending.turn % 2 == 1 else 0
+            for sq, code in enumerate(pending.board):
+                if code:
+                    key ^= _ZOBRIST[_CODE_NAMES[code]][sq]
+            return key
+        return self._key
+
+    def print_board(self):
+        '''
+        prints the current board configuration
+        :return: nothing
+        '''
+        height, width = self._rules.height, self._rules.width
+        # initialize the column labels
+        col_labels = '  ' + ''.join(' ' + chr(97 + col) + ' ' for col in range(width))
+        print(col_labels)  # print the labels for the first line
+        for i, row in enumerate(self._board[:height]):
+            row_num = str(height - i)  # get current row number
+            row_string = ' '.join([' ' + (piece.get_name() if piece != '' else '.') for piece in row[:width]])
+            print(f"{row_num} {row_string} {row_num}")  # formatting
+        print(col_labels)  # print the labels for the last line
+
+    def get_game_state(self):
+        '''
+        gets the current game state
+        :return: 'UNFINISHED', 'WHITE_WON', 'BLACK_WON', or 'DRAW' when the variant's repetition or ply limit ended
+        the game
+        '''
+        pending = self.__dict__.get('_pending_snapshot')
+        if pending is not None:
+            return pending.state
+        return self._state
+
+    def _gen_moves(self):
+        '''
+        gets every legal move for the player whose turn it is
+        :return: list of (start, end) square index pairs
+        '''
+        if self._state != 'UNFINISHED':
+            return []
+        turn = 'white' if self._turn % 2 == 0 else 'black'
+        board = self._board
+        rules = self._rules
+        moves = []
+        for sq in range(64):
+            piece = board[sq >> 3][sq & 7]
+            if piece != '' and piece.get_color() == turn:
+                for e_sq in piece.gen_moves(sq, board, rules):
+                    moves.append((sq, e_sq))
+        return moves
+
+    def legal_moves(self):
+        '''
+        generates every legal move for the player whose turn it is
+        :return: generator of (start, end) pairs in algebraic notation
+        '''
+        names = self._rules.names
+        for s_sq, e_sq in self._gen_moves():
+            yield names[s_sq], names[e_sq]
+
+    def legal_moves_from(self, square):
+        '''
+        generates every legal move of the piece on one square; nothing if the square is empty, holds a piece of the
+        player who isn't moving, or the game has finished
+        :param square: the square in algebraic notation
+        :return: generator of (start, end) pairs in algebraic notation
+        '''
+        sq = self._rules.squares.get(square)
+        if sq is None or self._state != 'UNFINISHED':
+            return
+        piece = self._board[sq >> 3][sq & 7]
+        if piece == '' or piece.get_color() != ('white' if self._turn % 2 == 0 else 'black'):
+            return
+        for e_sq in piece.gen_moves(sq, self._board, self._rules):
+            yield square, self._rules.names[e_sq]
+
+    def _get_attacks(self):
+        '''
+        gets the attack maps, building them the first time; from then on every move keeps them up to date
+        :return: _AttackMaps
+        '''
+        if self._attacks is None:
+            self._attacks = _AttackMaps(self._board)
+        return self._attacks
+
+    def get_attack_map(self, color):
+        '''
+        gets every square attacked by one color, including squares holding its own pieces
+        :param color: 'white' or 'black'
+        :return: 64-bit integer with bit (row * 8 + col) set for every attacked square
+        '''
+        return self._get_attacks().get_map(color) & self._rules.board_mask
+
+    def is_attacked(self, square, color):
+        '''
+        checks whether a square is attacked by one color
+        :param square: square in algebraic notation
+        :param color: 'white' or 'black'
+        :return: true if any piece of that color attacks the square
+        '''
+        return self._get_attacks().attacked_by(self._rules.squares[square], color) != 0
+
+    def threatened_last_pieces(self, color):
+        '''
+        finds the pieces of one color that are the last of their type (the last before the variant's lose_at count)
+        and attacked by the other color, i.e. the captures that would lose the game for that color
+        :param color: 'white' or 'black'
+        :return: list of (piece name, square in algebraic notation) pairs, king first and pawn last
+        '''
+        other = 'black' if color == 'white' else 'white'
+        names = [name for name in ('kqrbnp' if color == 'white' else 'KQRBNP')
+                 # only the last piece of a type loses the game, or any of the last few when the variant has a lose_at
+                 if self._pieces[name].get_num() == self._rules.lose_at[name] + 1]
+        if not names:
+            return []
+        attacks = self._get_attacks()
+        threatened = []
+        for name in names:
+            bits = attacks._where[name]
+            while bits:
+                sq = (bits & -bits).bit_length() - 1
+                bits &= bits - 1
+                if attacks.attacked_by(sq, other):
+                    threatened.append((name, self._rules.names[sq]))
+        return threatened
+
+    def _get_where(self):
+        '''
+        gets the bitboard of every piece name, from the attack maps if they are kept, otherwise from the board
+        :return: dict of piece name -> bitboard, not to be changed
+        '''
+        if self._attacks is not None:
+            return self._attacks._where
+        return _piece_bitboards(self._board)
+
+    def _get_left(self):
+        '''
+        gets how many pieces of every type are left above the count at which their side loses
+        :return: dict of piece name -> number of pieces
+        '''
+        lose_at = self._rules.lose_at
+        return {name: piece.get_num() - lose_at[name] for name, piece in self._pieces.items()}
+
+    def see(self, start, end):
+        '''
+        static exchange evaluation of a move: plays out the captures on its end square, X-ray attackers behind
+        sliding pieces included, with each side capturing with its least valuable piece and stopping when going on
+        would lose more, and an exchange that captures the last of a type ending the game; no search is done
+        :param start: the square we are starting with
+        :param end: the square we are moving the piece into
+        :return: what the move gains for the player making it, in the engine's score units (_WIN_SCORE when it wins
+        the game, about -_WIN_SCORE when the exchange loses it, 0 for an even or no exchange), or None if the move
+        can't be made
+        '''
+        if self.check_move(start, end) is not None:
+            return None
+        squares = self._rules.squares
+        return _see(self._board, squares[start], squares[end], self._get_where(), self._get_left())
+
+    def best_move(self, depth=None, time_limit=None, tt=None):
+        '''
+        searches for the best move for the player whose turn it is, with iterative deepening alpha-beta and a
+        quiescence search on captures; details of the search are kept for get_search_info()
+        :param depth: deepest iteration to search, 4 by default when there is no time limit
+        :param time_limit: seconds the search may take; the best move from the last finished iteration is returned
+        :param tt: TranspositionTable to use, by default one kept with the game
+        :return: the best move as a (start, end) pair in algebraic notation, or None if there is no legal move
+        '''
+        start_time = time.perf_counter()
+        if tt is None:
+            if self._tt is None:
+                self._tt = TranspositionTable(1 << 16)
+            tt = self._tt
+        tt.new_search()
+        if depth is None:
+            depth = 4 if time_limit is None else 64
+        deadline = start_time + time_limit if time_limit is not None else None
+        search = _Search(self, tt, deadline)
+        # the search keeps bitboards of its own, and updating the attack maps on every node would cost more than
+        # the rest of a push; it ends on the position it started from, so the maps are still right afterwards
+        attacks, self._attacks = self._attacks, None
+        try:
+            info = search.run(depth, start_time)
+        finally:
+            self._attacks = attacks
+
+        elapsed = time.perf_counter() - start_time
+        move = info['move']
+        names = self._rules.names
+        self._search_info = {
+            'depth': info['depth'],
+            'score': info['score'],
+            'nodes': info['nodes'],
+            'time': elapsed,
+            'nps': int(info['nodes'] / elapsed) if elapsed > 0 else 0,
+            'pv': [(names[s_sq], names[e_sq]) for s_sq, e_sq in info['pv']],
+        }
+        return (names[move[0]], names[move[1]]) if move is not None else None
+
+    def get_search_info(self):
+        '''
+        gets the details of the last best_move() search
+        :return: dict with depth, score (for the player to move), nodes, time, nps and pv, or None
+        '''
+        return self._search_info
+
+    def check_move(self, start, end):
+        '''
+        checks whether a move can be made, and if not, why; relies on get_color() from the Piece class to determine
+        whose piece is moving and on check_legal() from the piece's class to determine if the move is valid
+        :param start: the square we are starting with
+        :param end: the square we are moving the piece into
+        :return: None if the move is legal, otherwise BAD_SQUARE, GAME_OVER, NO_PIECE, WRONG_TURN or ILLEGAL_MOVE
+        '''
+        # both squares have to be on the board
+        squares = self._rules.squares
+        if start not in squares or end not in squares:
+            return BAD_SQUARE
+        # check_legal() only knows the standard rules, so other board sizes and pawn rules go by the variant's tables
+        if not self._rules.piece_rules:
+            return self._check_idx(squares[start], squares[end])
+        # no moves are allowed once the game has finished
+        if self._state != 'UNFINISHED':
+            return GAME_OVER
+
+        # first, convert algebraic notation to indices
+        s_col, s_row = ord(start[0]) - 97, abs(int(start[1]) - 8)
+        # get info for the square we are starting with
+        s = self._board[s_row][s_col]
+
+        # check whose turn it is. Use remainder to alternate between black and white
+        if self._turn % 2 == 0:
+            turn = 'white'
+        else:
+            turn = 'black'
+
+        # check if there is a piece to move and it's the current color's turn to move it
+        if s == '':
+            return NO_PIECE
+        if s.get_color() != turn:
+            return WRONG_TURN
+
+        # check whether the move is legal for the type of piece we are moving
+        if s.check_legal(start, end, self._board) is False:
+            return ILLEGAL_MOVE
+        return None
+
+    def check_moves(self, moves):
+        '''
+        checks many candidate moves from the current position in one call, e.g. every move a front end or a
+        training pipeline offers; none of them is made
+        :param moves: iterable of (start, end) pairs, either both in algebraic notation or both square indices
+        :return: list with None for every move that can be made and otherwise the reason it can't, as given by
+        check_move()
+        '''
+        lookup = self._rules.lookup
+        check_idx = self._check_idx
+        reasons = []
+        for start, end in moves:
+            s_sq, e_sq = lookup.get(start), lookup.get(end)
+            reasons.append(BAD_SQUARE if s_sq is None or e_sq is None else check_idx(s_sq, e_sq))
+        return reasons
+
+    def check_move_codes(self, codes):
+        '''
+        same as check_moves() with every move given as one move code, start * 64 + end with the squares as indices
+        (the encoding export.py stores moves in), which saves looking the squares up
+        :param codes: iterable of move codes
+        :return: list with None for every move that can be made and otherwise the reason it can't
+        '''
+        valid = self._rules.valid_codes
+        check_idx = self._check_idx
+        return [check_idx(code >> 6, code & 63) if code in valid else BAD_SQUARE for code in codes]
+
+    def _check_idx(self, s_sq, e_sq):
+        '''
+        checks a move given as square indices with the move tables instead of parsing algebraic notation again;
+        gives the same answers as check_move()
+        :param s_sq: start square index, 0 to 63
+        :param e_sq: end square index, 0 to 63
+        :return: None if the move is legal, otherwise GAME_OVER, NO_PIECE, WRONG_TURN or ILLEGAL_MOVE
+        '''
+        if self._state != 'UNFINISHED':
+            return GAME_OVER
+        board = self._board
+        s = board[s_sq >> 3][s_sq & 7]
+        if s == '':
+            return NO_PIECE
+        color = s.get_color()
+        if color != ('white' if self._turn % 2 == 0 else 'black'):
+            return WRONG_TURN
+        e = board[e_sq >> 3][e_sq & 7]
+        # the endpoint can't hold a piece of the same color
+        if e != '' and e.get_color() == color:
+            return ILLEGAL_MOVE
+        name = s.get_name()
+        rules = self._rules
+        if name == 'p' or name == 'P':
+            # capturing has to be 1 square diagonally forward, and moving forward needs an empty square
+            if e != '':
+                return None if rules.pawn_attacks[color][s_sq] & _BIT[e_sq] else ILLEGAL_MOVE
+            if e_sq == rules.pawn_push[color][s_sq]:
+                return None
+            # 2 squares also needs the square in between to be empty
+            if e_sq == rules.pawn_double[color][s_sq] and board[((s_sq + e_sq) >> 1) >> 3][s_sq & 7] == '':
+                return None
+            return ILLEGAL_MOVE
+        # every other piece needs the right geometry and nothing in between
+        if rules.moves[name][s_sq * 64 + e_sq] is None:
+            return ILLEGAL_MOVE
+        for sq in _BETWEEN_SQUARES[s_sq * 64 + e_sq]:
+            if board[sq >> 3][sq & 7] != '':
+                return ILLEGAL_MOVE
+        return None
+
+    def make_move_idx(self, from_sq, to_sq):
+        '''
+        same as make_move() but with the squares given as indices (row * 8 + col, so 'a8' is 0 and 'h1' is 63),
+        skipping the algebraic notation altogether
+        :param from_sq: start square index
+        :param to_sq: end square index
+        :return: false if the move is invalid, true if otherwise
+        '''
+        if self._check_squares(from_sq, to_sq) is not None:
+            return False
+        self._push(from_sq, to_sq)
+        if len(self._undo) > _UNDO_LIMIT:
+            self._trim_undo()
+        return True
+
+    def _check_squares(self, from_sq, to_sq):
+        '''
+        checks a move given as square indices that may be off the board
+        :param from_sq: start square index
+        :param to_sq: end square index
+        :return: None if the move is legal, otherwise BAD_SQUARE or a reason from _check_idx()
+        '''
+        names = self._rules.names
+        if not (0 <= from_sq < 64 and 0 <= to_sq < 64) or names[from_sq] is None or names[to_sq] is None:
+            return BAD_SQUARE
+        return self._check_idx(from_sq, to_sq)
+
+    def make_moves(self, moves):
+        '''
+        makes a list of moves in one call, e.g. to replay a whole game, stopping at the first one that can't be made
+        :param moves: iterable of (start, end) pairs, either both in algebraic notation or both square indices
+        :return: (number of moves made, None if they all were, otherwise the reason the next one failed:
+        BAD_SQUARE, GAME_OVER, NO_PIECE, WRONG_TURN or ILLEGAL_MOVE)
+        '''
+        count, reason = 0, None
+        squares, names = self._rules.squares, self._rules.names
+        for start, end in moves:
+            # algebraic squares go through the square table, anything it doesn't know becomes -1
+            s_sq = squares.get(start, -1) if isinstance(start, str) else start
+            e_sq = squares.get(end, -1) if isinstance(end, str) else end
+            if not (0 <= s_sq < 64 and 0 <= e_sq < 64) or names[s_sq] is None or names[e_sq] is None:
+                reason = BAD_SQUARE
+                break
+            reason = self._check_idx(s_sq, e_sq)
+            if reason is not None:
+                break
+            self._push(s_sq, e_sq)
+            count += 1
+        if len(self._undo) > _UNDO_LIMIT:
+            self._trim_undo()
+        return count, reason
+
+    def make_move(self, start, end):
+        '''
+        moves the piece in "start" to "end"; relies on _check_idx() to determine if the proposed move is valid, which
+        gives the same answers as check_move() from the move tables, and on _push() to move the piece, remove any
+        captured piece, keep track of the number of pieces left on the board and update the game state and whose
+        turn it is.
+        :param start: the square we are starting with
+        :param end: the square we are moving the piece into
+        :return: false if the move is invalid, true if otherwise
+        '''
+        # first, convert algebraic notation to indices; anything that isn't a square on the board has none
+        squares = self._rules.squares
+        s_sq, e_sq = squares.get(start), squares.get(end)
+        if s_sq is None or e_sq is None or self._check_idx(s_sq, e_sq) is not None:
+            return False
+
+        # otherwise, the move is legal, and we move the piece from start to end
+        self._push(s_sq, e_sq)
+        if len(self._undo) > _UNDO_LIMIT:
+            self._trim_undo()
+
+        # if nothing goes wrong, return true
+        return True
+
+    def _trim_undo(self):
+        '''
+        drops all but the last _UNDO_KEEP moves that can be taken back
+        :return: nothing
+        '''
+        del self._undo[:-_UNDO_KEEP]
+
+    def _push(self, s_sq, e_sq):
+        '''
+        moves the piece on s_sq to e_sq without checking the move, and records what is needed to take it back
+        :param s_sq: start square index
+        :param e_sq: end square index
+        :return: nothing
+        '''
+        board = self._board
+        s = board[s_sq >> 3][s_sq & 7]
+        e = board[e_sq >> 3][e_sq & 7]
+        # the captured piece ('' if none), the state and the key before the move are all pop() needs
+        self._undo.append((s_sq, e_sq, e, self._state, self._key))
+        board[s_sq >> 3][s_sq & 7] = ''
+        board[e_sq >> 3][e_sq & 7] = s
+        if self._attacks is not None:
+            self._attacks.update(board, s_sq, e_sq)
+        zobrist = _ZOBRIST[s.get_name()]
+        self._key ^= zobrist[s_sq] ^ zobrist[e_sq] ^ _ZOBRIST_TURN
+
+        # in case of capturing
+        if e != '':
+            self._key ^= _ZOBRIST[e.get_name()][e_sq]
+            e.update_num(e.get_num() - 1)
+            # the game is lost when a type is down to the variant's count, which is 0 in the standard game
+            if e.get_num() == self._rules.lose_at[e.get_name()]:
+                if s.get_color() == 'white':
+                    self._state = 'WHITE_WON'
+                else:
+                    self._state = 'BLACK_WON'
+        # update the turn counter to alternate between black and white each turn
+        self._turn += 1
+        # the variant's draws: the same position for the repetitions-th time, or the ply limit reached
+        rules = self._rules
+        if rules.draws:
+            count = self._seen.get(self._key, 0) + 1
+            self._seen[self._key] = count
+            if self._state == 'UNFINISHED' and (0 < rules.repetitions <= count or 0 < rules.max_plies <= self._turn):
+                self._state = 'DRAW'
+
+    def _pop(self):
+        '''
+        takes back the last move made with _push()
+        :return: (start, end) square index pair of the move taken back
+        '''
+        # the undo entry comes off first, so that with none left nothing has been changed when IndexError is raised
+        s_sq, e_sq, e, state, key = self._undo.pop()
+        if self._rules.draws:
+            self._seen[self._key] -= 1
+        self._key = key
+        board = self._board
+        board[s_sq >> 3][s_sq & 7] = board[e_sq >> 3][e_sq & 7]
+        board[e_sq >> 3][e_sq & 7] = e
+        if self._attacks is not None:
+            self._attacks.update(board, s_sq, e_sq)
+        # give the captured piece back to the count
+        if e != '':
+            e.update_num(e.get_num() + 1)
+        self._state = state
+        self._turn -= 1
+        return s_sq, e_sq
+
+    def push(self, move):
+        '''
+        makes a move without checking whether it is legal, so it can be taken back with pop(); meant for searching
+        ahead with moves from legal_moves()
+        :param move: (start, end) pair in algebraic notation
+        :return: nothing
+        '''
+        self._push(self._rules.squares[move[0]], self._rules.squares[move[1]])
+
+    def pop(self):
+        '''
+        takes back the last move made with push() or make_move(); only the last _UNDO_KEEP moves made with
+        make_move() and the like are sure to be kept. Raises IndexError if there is none
+        :return: the move taken back as a (start, end) pair in algebraic notation
+        '''
+        s_sq, e_sq = self._pop()
+        return self._rules.names[s_sq], self._rules.names[e_sq]
+
+
+# rows of the check_move_codes() table for a start square with a piece of the wrong color or of the right color
+_WRONG_TURN_ROW = [WRONG_TURN] * 64
+_ILLEGAL_ROW = [ILLEGAL_MOVE] * 64
+# batches smaller than this are checked one move at a time by BitboardChessVar.check_move_codes()
+_TABLE_BATCH = 128
+# check_move_codes() tables to start from, with the 4096 codes of a board followed by 4096 of BAD_SQUARE
+_NO_PIECE_TABLE = [NO_PIECE] * 4096 + [BAD_SQUARE] * 4096
+_GAME_OVER_TABLE = [GAME_OVER] * 4096 + [BAD_SQUARE] * 4096
+
+
+class BitboardChessVar(ChessVar):
+    '''
+    alternative backend for the game that keeps an occupancy bitboard next to the board, plus one 64-bit integer
+    per piece type and color built when asked for, and validates moves with the precomputed attack tables instead
+    of walking the board; check_moves() and check_move_codes() answer large batches of candidate moves from one
+    table of every move's answer per position
+    '''
+
+    def __init__(self, variant=None):
+        '''
+        :param variant: Variant to play, STANDARD by default
+        '''
+        super().__init__(variant)
+        # a variant's layout has been set up through _load(), which builds the bitboards; the standard one hasn't
+        if variant is None:
+            self._occupied = STANDARD.start_occupied
+            self._bb = None
+
+    def _sync_bitboards(self):
+        '''
+        rebuilds the occupancy board from the board
+        :return: nothing
+        '''
+        # every occupied square, the only bitboard moves keep up to date; the color of a piece is read off the board
+        self._occupied = 0
+        for sq in range(64):
+            if self._board[sq >> 3][sq & 7] != '':
+                self._occupied |= _BIT[sq]
+        # one bitboard per piece name, e.g. 'Q' for the black queen, built when first asked for after a move
+        self._bb = None
+
+    def _load(self, names, turn, state, counts=None):
+        '''
+        sets up a position on both the board and the bitboards
+        :return: nothing
+        '''
+        super()._load(names, turn, state, counts)
+        self._sync_bitboards()
+
+    def _get_where(self):
+        '''
+        gets the bitboard of every piece name, building them from the board the first time they are asked for
+        since the last move
+        :return: dict of piece name -> bitboard, not to be changed
+        '''
+        if self._bb is None:
+            self._bb = _piece_bitboards(self._board)
+        return self._bb
+
+    def get_bitboard(self, name):
+        '''
+        gets the bitboard of one type/color of piece
+        :param name: name of the piece, e.g. 'Q' for the black queen
+        :return: 64-bit integer with bit (row * 8 + col) set for every square holding the piece
+        '''
+        return self._get_where()[name]
+
+    def _targets(self, s_sq):
+        '''
+        gets every square the piece on s_sq may legally move to, so a whole row of candidate moves can be validated
+        with one bit test each
+        :param s_sq: start square index
+        :return: bitboard of the legal end squares
+        '''
+        piece = self._board[s_sq >> 3][s_sq & 7]
+        if piece == '':
+            return 0
+        bb = self._get_where()
+        own = 0
+        for own_name in ('pnbrqk' if piece.get_color() == 'white' else 'PNBRQK'):
+            own |= bb[own_name]
+        return self._piece_targets(s_sq, piece, own)
+
+    def _piece_targets(self, s_sq, piece, own):
+        '''
+        same as _targets() with the piece and the squares of its own color already known
+        :param s_sq: start square index
+        :param piece: the piece on s_sq
+        :param own: bitboard of every piece of the piece's color
+        :return: bitboard of the legal end squares
+        '''
+        color = piece.get_color()
+        opp = self._occupied ^ own
+        name = piece.get_name().lower()
+        rules = self._rules
+        if name == 'n':
+            return rules.knight_attacks[s_sq] & ~own
+        if name == 'k':
+            return rules.king_attacks[s_sq] & ~own
+        if name == 'p':
+            targets = rules.pawn_attacks[color][s_sq] & opp
+            e_sq = rules.pawn_push[color][s_sq]
+            if e_sq >= 0 and not (own | opp) & _BIT[e_sq]:
+                targets |= _BIT[e_sq]
+                e_sq = rules.pawn_double[color][s_sq]
+                if e_sq >= 0 and not (own | opp) & _BIT[e_sq]:
+                    targets |= _BIT[e_sq]
+            return targets
+        rays = _ROOK_RAYS if name == 'r' else _BISHOP_RAYS if name == 'b' else _ROOK_RAYS + _BISHOP_RAYS
+        return _ray_attacks(s_sq, own | opp, rays) & ~own & rules.board_mask
+
+    def check_move(self, start, end):
+        '''
+        checks whether a move can be made using the bitboards, with the same results as ChessVar.check_move
+        :param start: the square we are starting with
+        :param end: the square we are moving the piece into
+        :return: None if the move is legal, otherwise BAD_SQUARE, GAME_OVER, NO_PIECE, WRONG_TURN or ILLEGAL_MOVE
+        '''
+        s_sq, e_sq = self._rules.squares.get(start), self._rules.squares.get(end)
+        if s_sq is None or e_sq is None:
+            return BAD_SQUARE
+        return self._check_idx(s_sq, e_sq)
+
+    def check_moves(self, moves):
+        '''
+        checks many candidate moves from the current position in one call, with the same results as
+        ChessVar.check_moves(), by turning each into its move code and going through check_move_codes()
+        :param moves: iterable of (start, end) tuples, either both in algebraic notation or both square indices
+        :return: list with None for every move that can be made and otherwise the reason it can't
+        '''
+        # pairs that aren't squares on the board get code -1, which is never valid
+        return self.check_move_codes(map(self._rules.move_codes.get, moves, repeat(-1)))
+
+    def check_move_codes(self, codes):
+        '''
+        same as ChessVar.check_move_codes(), filling a table with the answer for each of the 4096 codes once, from
+        the target bitboards, so that each candidate then costs one list index; the table costs about as much as a
+        hundred moves checked one at a time, so smaller batches are checked one at a time instead
+        :param codes: iterable of move codes, start * 64 + end
+        :return: list with None for every move that can be made and otherwise the reason it can't
+        '''
+        codes = codes if codes.__class__ is list else list(codes)
+        if len(codes) < _TABLE_BATCH:
+            return ChessVar.check_move_codes(self, codes)
+        # the second half of the table answers BAD_SQUARE for the codes from -4096 to -1, which index from the end,
+        # and from 4096 to 8191; codes further out than that fall back to checking the range of each one
+        if self._state != 'UNFINISHED':
+            table = _GAME_OVER_TABLE[:]
+        else:
+            table = _NO_PIECE_TABLE[:]
+            board = self._board
+            turn = 'white' if self._turn % 2 == 0 else 'black'
+            # the pieces of the player to move, and every square they are on
+            mine, own = [], 0
+            for sq in range(64):
+                piece = board[sq >> 3][sq & 7]
+                if piece == '':
+                    continue
+                code = sq * 64
+                if piece.get_color() != turn:
+                    table[code:code + 64] = _WRONG_TURN_ROW
+                    continue
+                table[code:code + 64] = _ILLEGAL_ROW
+                mine.append((sq, piece))
+                own |= _BIT[sq]
+            # the legal moves, one per bit of each target bitboard
+            for sq, piece in mine:
+                targets, code = self._piece_targets(sq, piece, own), sq * 64
+                while targets:
+                    low = targets & -targets
+                    table[code + low.bit_length() - 1] = None
+                    targets ^= low
+        for code in self._rules.off_codes:
+            table[code] = BAD_SQUARE
+        try:
+            return [table[code] for code in codes]
+        except IndexError:
+            return [table[code] if 0 <= code < 4096 else BAD_SQUARE for code in codes]
+
+    def make_move(self, start, end):
+        '''
+        same as ChessVar.make_move(), with the checks of _check_idx() done in place so a move costs one call into
+        the bitboards
+        :param start: the square we are starting with
+        :param end: the square we are moving the piece into
+        :return: false if the move is invalid, true if otherwise
+        '''
+        squares = self._rules.squares
+        s_sq, e_sq = squares.get(start), squares.get(end)
+        if s_sq is None or e_sq is None or self._state != 'UNFINISHED':
+            return False
+        board = self._board
+        s = board[s_sq >> 3][s_sq & 7]
+        if s == '':
+            return False
+        color = s.get_color()
+        if color != ('white' if self._turn % 2 == 0 else 'black'):
+            return False
+        e = board[e_sq >> 3][e_sq & 7]
+        if e != '' and e.get_color() == color:
+            return False
+        name = s.get_name()
+        rules = self._rules
+        if name == 'p' or name == 'P':
+            if e != '':
+                if not rules.pawn_attacks[color][s_sq] & _BIT[e_sq]:
+                    return False
+            elif e_sq != rules.pawn_push[color][s_sq] and (e_sq != rules.pawn_double[color][s_sq]
+                                                           or self._occupied & _BIT[(s_sq + e_sq) >> 1]):
+                return False
+        else:
+            between = rules.moves[name][s_sq * 64 + e_sq]
+            if between is None or between & self._occupied:
+                return False
+
+        # then what _push() does, without looking the pieces up again
+        self._undo.append((s_sq, e_sq, e, 'UNFINISHED', self._key))
+        if len(self._undo) > _UNDO_LIMIT:
+            self._trim_undo()
+        board[s_sq >> 3][s_sq & 7] = ''
+        board[e_sq >> 3][e_sq & 7] = s
+        if self._attacks is not None:
+            self._attacks.update(board, s_sq, e_sq)
+        self._bb = None
+        zobrist = _ZOBRIST[name]
+        key = self._key ^ zobrist[s_sq] ^ zobrist[e_sq] ^ _ZOBRIST_TURN
+        if e == '':
+            self._occupied ^= _BIT[s_sq] | _BIT[e_sq]
+        else:
+            self._occupied ^= _BIT[s_sq]
+            name = e.get_name()
+            key ^= _ZOBRIST[name][e_sq]
+            e.update_num(e.get_num() - 1)
+            if e.get_num() == rules.lose_at[name]:
+                self._state = 'WHITE_WON' if color == 'white' else 'BLACK_WON'
+        self._key = key
+        self._turn += 1
+        if rules.draws:
+            count = self._seen.get(key, 0) + 1
+            self._seen[key] = count
+            if self._state == 'UNFINISHED' and (0 < rules.repetitions <= count or 0 < rules.max_plies <= self._turn):
+                self._state = 'DRAW'
+        return True
+
+    def _check_idx(self, s_sq, e_sq):
+        '''
+        checks a move given as square indices, testing the squares in between against the occupancy board instead
+        of looking at them one by one
+        :param s_sq: start square index, 0 to 63
+        :param e_sq: end square index, 0 to 63
+        :return: None if the move is legal, otherwise GAME_OVER, NO_PIECE, WRONG_TURN or ILLEGAL_MOVE
+        '''
+        if self._state != 'UNFINISHED':
+            return GAME_OVER
+        board = self._board
+        s = board[s_sq >> 3][s_sq & 7]
+        if s == '':
+            return NO_PIECE
+        color = s.get_color()
+        if color != ('white' if self._turn % 2 == 0 else 'black'):
+            return WRONG_TURN
+        e = board[e_sq >> 3][e_sq & 7]
+        # the endpoint can't hold a piece of the same color
+        if e != '' and e.get_color() == color:
+            return ILLEGAL_MOVE
+        name = s.get_name()
+        rules = self._rules
+        if name == 'p' or name == 'P':
+            # capturing has to be 1 square diagonally forward
+            if e != '':
+                return None if rules.pawn_attacks[color][s_sq] & _BIT[e_sq] else ILLEGAL_MOVE
+            if e_sq == rules.pawn_push[color][s_sq]:
+                return None
+            # 2 squares forward is only allowed from the starting row and when the square in between is empty
+            if e_sq == rules.pawn_double[color][s_sq] and not self._occupied & _BIT[(s_sq + e_sq) >> 1]:
+                return None
+            return ILLEGAL_MOVE
+        # every other piece needs the right geometry and nothing in between
+        between = rules.moves[name][s_sq * 64 + e_sq]
+        if between is None or between & self._occupied:
+            return ILLEGAL_MOVE
+        return None
+
+    def _push(self, s_sq, e_sq):
+        '''
+        moves the piece on s_sq to e_sq on both the board and the occupancy board in one pass, doing everything
+        ChessVar._push() does; the bitboards of each piece name are dropped, to be built again only if asked for
+        :param s_sq: start square index
+        :param e_sq: end square index
+        :return: nothing
+        '''
+        board = self._board
+        s = board[s_sq >> 3][s_sq & 7]
+        e = board[e_sq >> 3][e_sq & 7]
+        self._undo.append((s_sq, e_sq, e, self._state, self._key))
+        board[s_sq >> 3][s_sq & 7] = ''
+        board[e_sq >> 3][e_sq & 7] = s
+        if self._attacks is not None:
+            self._attacks.update(board, s_sq, e_sq)
+        self._bb = None
+        zobrist = _ZOBRIST[s.get_name()]
+        self._key ^= zobrist[s_sq] ^ zobrist[e_sq] ^ _ZOBRIST_TURN
+
+        # in case of capturing, the end square stays occupied
+        if e == '':
+            self._occupied ^= _BIT[s_sq] | _BIT[e_sq]
+        else:
+            self._occupied ^= _BIT[s_sq]
+            name = e.get_name()
+            self._key ^= _ZOBRIST[name][e_sq]
+            e.update_num(e.get_num() - 1)
+            if e.get_num() == self._rules.lose_at[name]:
+                self._state = 'WHITE_WON' if s.get_color() == 'white' else 'BLACK_WON'
+        self._turn += 1
+        rules = self._rules
+        if rules.draws:
+            count = self._seen.get(self._key, 0) + 1
+            self._seen[self._key] = count
+            if self._state == 'UNFINISHED' and (0 < rules.repetitions <= count or 0 < rules.max_plies <= self._turn):
+                self._state = 'DRAW'
+
+    def _pop(self):
+        '''
+        takes back the last move on both the board and the occupancy board in one pass
+        :return: (start, end) square index pair of the move taken back
+        '''
+        # the undo entry comes off first, so that with none left nothing has been changed when IndexError is raised
+        s_sq, e_sq, e, state, key = self._undo.pop()
+        if self._rules.draws:
+            self._seen[self._key] -= 1
+        self._key = key
+        board = self._board
+        s = board[e_sq >> 3][e_sq & 7]
+        board[s_sq >> 3][s_sq & 7] = s
+        board[e_sq >> 3][e_sq & 7] = e
+        if self._attacks is not None:
+            self._attacks.update(board, s_sq, e_sq)
+        self._bb = None
+        # give the captured piece back to the board and the count
+        if e == '':
+            self._occupied ^= _BIT[s_sq] | _BIT[e_sq]
+        else:
+            self._occupied ^= _BIT[s_sq]
+            e.update_num(e.get_num() + 1)
+        self._state = state
+        self._turn -= 1
+        return s_sq, e_sq
+
+
+def _metered_check_idx(check_idx):
+    '''
+    wraps the _check_idx() of a backend to count and time every move check
+    :param check_idx: the plain method
+    :return: the timing method
+    '''
+    def timed_check_idx(self, s_sq, e_sq):
+        start_time = time.perf_counter()
+        reason = check_idx(self, s_sq, e_sq)
+        seconds = time.perf_counter() - start_time
+        piece = self._board[s_sq >> 3][s_sq & 7]
+        _metrics.count_check(piece.__class__.__name__ if piece != '' else 'None', seconds)
+        return reason
+    return timed_check_idx
+
+
+def _metered_make_move(self, start, end):
+    '''
+    ChessVar.make_move() counting the move; the move is checked with _check_idx(), as the plain method does, so
+    the check is counted too
+    '''
+    squares = self._rules.squares
+    s_sq, e_sq = squares.get(start), squares.get(end)
+    reason = BAD_SQUARE if s_sq is None or e_sq is None else self._check_idx(s_sq, e_sq)
+    _metrics.count_moves(reason is None, reason)
+    if reason is not None:
+        return False
+    self._push(s_sq, e_sq)
+    if len(self._undo) > _UNDO_LIMIT:
+        self._trim_undo()
+    return True
+
+
+def _metered_make_move_idx(self, from_sq, to_sq):
+    '''
+    ChessVar.make_move_idx() counting the move
+    '''
+    reason = self._check_squares(from_sq, to_sq)
+    _metrics.count_moves(reason is None, reason)
+    if reason is not None:
+        return False
+    self._push(from_sq, to_sq)
+    if len(self._undo) > _UNDO_LIMIT:
+        self._trim_undo()
+    return True
+
+
+def _metered_make_moves(self, moves):
+    '''
+    ChessVar.make_moves() counting the moves
+    '''
+    count, reason = _PLAIN_METHODS[ChessVar, 'make_moves'](self, moves)
+    _metrics.count_moves(count, reason)
+    return count, reason
+
+
+def _metered_best_move(self, depth=None, time_limit=None, tt=None):
+    '''
+    ChessVar.best_move() counting the search
+    '''
+    move = _PLAIN_METHODS[ChessVar, 'best_move'](self, depth, time_limit, tt)
+    _metrics.count_search(self._search_info['nodes'], self._search_info['time'])
+    return move
+
+
+# the counting methods enable_metrics() swaps into the classes, and the plain ones disable_metrics() puts back;
+# subclasses such as BitboardChessVar inherit whichever are in place, except for the methods they have of their own
+_METERED = [(ChessVar, 'make_move', _metered_make_move), (ChessVar, 'make_move_idx', _metered_make_move_idx),
+            (ChessVar, 'make_moves', _metered_make_moves), (ChessVar, 'best_move', _metered_best_move),
+            (BitboardChessVar, 'make_move', _metered_make_move)]
+_METERED += [(cls, '_check_idx', _metered_check_idx(cls._check_idx)) for cls in (ChessVar, BitboardChessVar)]
+_PLAIN_METHODS = {(cls, name): cls.__dict__[name] for cls, name, _ in _METERED}
+
+
+def _check_legal_moves(game):
+    '''
+    gets every legal move by asking check_legal() about every square pair, which is slow but uses the original
+    rules code, so perft can use it as a correctness oracle for the move generator
+    :param game: ChessVar to get the moves of
+    :return: list of (start, end) square index pairs
+    '''
+    if game.get_game_state() != 'UNFINISHED':
+        return []
+    turn = 'white' if game._turn % 2 == 0 else 'black'
+    board = game._board
+    moves = []
+    for s_sq in range(64):
+        piece = board[s_sq >> 3][s_sq & 7]
+        if piece != '' and piece.get_color() == turn:
+            for e_sq in range(64):
+                if piece.check_legal(_SQUARE_NAMES[s_sq], _SQUARE_NAMES[e_sq], board):
+                    moves.append((s_sq, e_sq))
+    return moves
+
+
+def perft(game, depth, oracle=False):
+    '''
+    counts the leaf nodes of the move tree; a move that wins the game is a leaf however deep it is, and the moves at
+    the last ply are counted without being made
+    :param game: ChessVar to count from, which is left as it was
+    :param depth: number of plies; at 0 or less the position itself is the only leaf
+    :param oracle: whether to generate moves with check_legal() instead of legal_moves()
+    :return: number of leaf nodes
+    '''
+    if depth <= 0 or game._state != 'UNFINISHED':
+        return 1
+    moves = _check_legal_moves(game) if oracle else game._gen_moves()
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for s_sq, e_sq in moves:
+        game._push(s_sq, e_sq)
+        total += perft(game, depth - 1, oracle)
+        game._pop()
+    return total
+
+
+def _perft_after(game, move, depth, oracle):
+    '''
+    counts the leaf nodes below one root move, in a worker process
+    :return: number of leaf nodes
+    '''
+    game._push(move[0], move[1])
+    return perft(game, depth, oracle)
+
+
+def perft_divide(game, depth, oracle=False, jobs=1):
+    '''
+    counts the leaf nodes below every root move
+    :param game: ChessVar to count from, which is left as it was
+    :param depth: number of plies, at least 1
+    :param oracle: whether to generate moves with check_legal() instead of legal_moves()
+    :param jobs: number of worker processes to split the root moves across
+    :return: list of ((start, end), leaf count) pairs in algebraic notation
+    '''
+    if depth < 1:
+        raise ValueError('perft_divide() needs a depth of at least 1')
+    moves = _check_legal_moves(game) if oracle else game._gen_moves()
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            counts = list(pool.map(_perft_after, [game] * len(moves), moves, [depth - 1] * len(moves),
+                                   [oracle] * len(moves)))
+    else:
+        counts = []
+        for s_sq, e_sq in moves:
+            game._push(s_sq, e_sq)
+            counts.append(perft(game, depth - 1, oracle))
+            game._pop()
+    names = game._rules.names
+    return [((names[s_sq], names[e_sq]), count) for (s_sq, e_sq), count in zip(moves, counts)]
+
+
+def _game_from_moves(moves):
+    '''
+    plays moves such as 'e2e4' from the starting position
+    :param moves: list of moves, each the start square followed by the end square
+    :return: the ChessVar
+    '''
+    game = ChessVar()
+    for move in moves:
+        if not game.make_move(move[:2], move[2:]):
+            raise SystemExit('illegal move: ' + move)
+    return game
+
+
+def _game_from_request(request):
+    '''
+    sets up the position of an analysis request
+    :param request: decoded request with "moves" (a list or space separated string of moves such as 'e2e4' from
+    the starting position), "board" (64 piece names in square order, a8 first, with "turn" 'white' or 'black') or
+    "bytes" (to_bytes() in hex)
+    :return: the ChessVar; raises ValueError if the request holds no position or an illegal move
+    '''
+    if 'moves' in request:
+        moves = request['moves']
+        game = ChessVar()
+        for ply, move in enumerate(moves.split() if isinstance(moves, str) else moves, 1):
+            if not game.make_move(move[:2], move[2:]):
+                raise ValueError(f"ply {ply}: {move} can't be made: {game.check_move(move[:2], move[2:])}")
+        return game
+    if 'bytes' in request:
+        data = bytes.fromhex(request['bytes'])
+        if len(data) < _RECORD_SIZE:
+            raise ValueError(f"bytes must be {_RECORD_SIZE} long")
+        return ChessVar.from_bytes(data)
+    if 'board' in request:
+        names = request['board']
+        if len(names) != 64 or any(name not in _COUNT_NAMES and name != '' for name in names):
+            raise ValueError('board must be 64 piece names or empty strings')
+        game = ChessVar()
+        lose_at = game._rules.lose_at
+        # a side with a type down to its lose_at count has already lost
+        state = 'UNFINISHED'
+        if any(names.count(name) <= lose_at[name] for name in 'pnbrqk'):
+            state = 'BLACK_WON'
+        elif any(names.count(name) <= lose_at[name] for name in 'PNBRQK'):
+            state = 'WHITE_WON'
+        game._load(list(names), 1 if request.get('turn', 'white') == 'black' else 0, state)
+        return game
+    raise ValueError('no "moves", "board" or "bytes" in the request')
+
+
+def analyze_position(request, depth=3, time_limit=None):
+    '''
+    analyses one position: its legal moves, the last pieces of a type each side has under attack, and the engine's
+    best move
+    :param request: decoded request as in _game_from_request()
+    :param depth: deepest search iteration, 0 for no search
+    :param time_limit: seconds the search may take, or None
+    :return: dict with state, legal_moves (the count), threatened (color -> list of (piece name, square) pairs),
+    and move (a (start, end) pair or None), score, depth and nodes unless there was no search; raises ValueError
+    for a request that holds no position
+    '''
+    game = _game_from_request(request)
+    result = {
+        'state': game.get_game_state(),
+        'legal_moves': len(game._gen_moves()),
+        'threatened': {color: game.threatened_last_pieces(color) for color in ('white', 'black')},
+    }
+    if depth or time_limit is not None:
+        # a table of its own, so the result doesn't depend on which positions were searched before
+        move = game.best_move(depth=depth or None, time_limit=time_limit, tt=TranspositionTable(1 << 16))
+        info = game.get_search_info()
+        result.update(move=move, score=info['score'], depth=info['depth'], nodes=info['nodes'])
+    return result
+
+
+def _analyze_chunk(chunk, depth, time_limit):
+    '''
+    analyses a chunk of request lines, in a worker process
+    :param chunk: list of (line number, line) pairs
+    :param depth: as in analyze_position()
+    :param time_limit: as in analyze_position()
+    :return: list of JSON result lines, each tagged with the "id" of its request, or its line number if it has none
+    '''
+    results = []
+    for number, line in chunk:
+        request_id = number
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            request_id = request.get('id', number)
+            result = {'id': request_id, **analyze_position(request, depth, time_limit)}
+        except (ValueError, TypeError, KeyError) as error:
+            # not JSON, no position, an illegal move or fields of the wrong type
+            result = {'id': request_id, 'error': str(error) or type(error).__name__}
+        results.append(json.dumps(result))
+    return results
+
+
+def _chunks(lines, chunk_size):
+    '''
+    groups the non-blank lines into chunks, numbering them from 1
+    :return: generator of lists of (line number, line) pairs
+    '''
+    chunk = []
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            chunk.append((number, line))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def analyze_lines(lines, depth=3, time_limit=None, jobs=1, chunk_size=64):
+    '''
+    analyses a stream of JSON request lines across a pool of worker processes; the workers are started once and
+    given a chunk of lines at a time, and only a few chunks per worker are read ahead, so the input can be
+    arbitrarily long
+    :param lines: iterable of lines, each a request as in _game_from_request(), optionally with an "id"
+    :param depth: as in analyze_position()
+    :param time_limit: as in analyze_position()
+    :param jobs: worker processes, one per core if None; 1 analyses in this process
+    :param chunk_size: lines sent to a worker at a time
+    :return: generator of JSON result lines, in the order the chunks finish rather than the input order
+    '''
+    chunks = _chunks(lines, chunk_size)
+    if jobs == 1:
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk, depth, time_limit)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        for chunk in chunks:
+            # enough chunks queued to keep every worker busy, without reading the whole input in
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(pool.submit(_analyze_chunk, chunk, depth, time_limit))
+        for future in as_completed(pending):
+            yield from future.result()
+
+
+def main(argv=None):
+    '''
+    command line entry point, run with python -m ChessVar
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status
+    '''
+    parser = argparse.ArgumentParser(prog='python -m ChessVar')
+    commands = parser.add_subparsers(dest='command', required=True)
+    perft_parser = commands.add_parser('perft', help='count leaf nodes of the move tree')
+    perft_parser.add_argument('depth', type=int)
+    perft_parser.add_argument('--moves', nargs='*', default=[], help="moves to play first, e.g. e2e4 e7e5")
+    perft_parser.add_argument('--divide', action='store_true', help='print the count below every root move')
+    perft_parser.add_argument('--jobs', type=int, default=1, help='worker processes for the root moves')
+    perft_parser.add_argument('--oracle', action='store_true', help='generate moves with check_legal()')
+    analyze_parser = commands.add_parser('analyze', help='analyse positions given as JSON lines')
+    analyze_parser.add_argument('path', nargs='?', default='-', help='file of requests, standard input by default')
+    analyze_parser.add_argument('--depth', type=int, default=3, help='search depth, 0 for no search')
+    analyze_parser.add_argument('--time-limit', type=float, default=None, help='seconds per search')
+    analyze_parser.add_argument('--jobs', type=int, default=None, help='worker processes, one per core by default')
+    analyze_parser.add_argument('--chunk-size', type=int, default=64, help='positions sent to a worker at a time')
+    args = parser.parse_args(argv)
+    if args.command == 'perft' and args.depth < 1:
+        perft_parser.error('depth must be at least 1')
+
+    if args.command == 'analyze':
+        lines = sys.stdin if args.path == '-' else open(args.path)
+        count = 0
+        start_time = time.perf_counter()
+        try:
+            for result in analyze_lines(lines, args.depth, args.time_limit, args.jobs, args.chunk_size):
+                sys.stdout.write(result + '\n')
+                count += 1
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+        sys.stdout.flush()
+        elapsed = time.perf_counter() - start_time
+        print(f"{count} positions in {elapsed:.2f} s", file=sys.stderr)
+
+    if args.command == 'perft':
+        game = _game_from_moves(args.moves)
+        start_time = time.perf_counter()
+        if args.divide or args.jobs > 1:
+            counts = perft_divide(game, args.depth, args.oracle, args.jobs)
+            total = sum(count for _, count in counts)
+            if args.divide:
+                for (start, end), count in counts:
+                    print(f"{start}{end}: {count}")
+        else:
+            total = perft(game, args.depth, args.oracle)
+        elapsed = time.perf_counter() - start_time
+        print(f"total: {total}")
+        print(f"time: {elapsed:.3f} s, {int(total / elapsed) if elapsed > 0 else 0} leaves/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
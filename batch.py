@@ -0,0 +1,236 @@
+# NumPy version of ChessVar that keeps thousands of games in arrays and steps them all at once
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for BatchChessVar
+    np = None
+
+from ChessVar import _BETWEEN, _BISHOP_RAYS, _KING_ATTACKS, _KNIGHT_ATTACKS, _MOVE_TABLES, _PAWN_ATTACKS, _ROOK_RAYS
+
+# piece codes on the board: 0 for an empty square, 1 to 6 for white pieces and -1 to -6 for black pieces
+_CODES = {'p': 1, 'n': 2, 'b': 3, 'r': 4, 'q': 5, 'k': 6}
+_STATES = ['UNFINISHED', 'WHITE_WON', 'BLACK_WON', 'DRAW']
+_START_ROW = ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
+_START_COUNTS = [8, 2, 2, 2, 1, 1]
+
+_TABLES = None
+
+
+def _tables():
+    '''
+    builds the move tables from the ChessVar ones the first time they are needed; boards of squares are uint64
+    bitboards with bit (row * 8 + col) for each square, like BitboardChessVar
+    :return: dict of numpy arrays
+    '''
+    global _TABLES
+    if _TABLES is None:
+        pushes, doubles = np.zeros((2, 64), dtype=np.uint64), np.zeros((2, 64), dtype=np.uint64)
+        for side, (step, first_row) in enumerate([(-8, 6), (8, 1)]):
+            for sq in range(64):
+                if 0 <= sq + step < 64:
+                    pushes[side, sq] = 1 << (sq + step)
+                if sq >> 3 == first_row:
+                    doubles[side, sq] = 1 << (sq + 2 * step)
+        _TABLES = {
+            'knight': np.array(_KNIGHT_ATTACKS, dtype=np.uint64),
+            'king': np.array(_KING_ATTACKS, dtype=np.uint64),
+            'capture': np.array([_PAWN_ATTACKS['white'], _PAWN_ATTACKS['black']], dtype=np.uint64),
+            'push': pushes,
+            'double': doubles,
+            'rook_rays': [(np.array(ray, dtype=np.uint64), positive) for ray, positive in _ROOK_RAYS],
+            'bishop_rays': [(np.array(ray, dtype=np.uint64), positive) for ray, positive in _BISHOP_RAYS],
+            # whether each piece code other than pawns can get from start to end on an empty board, and the squares
+            # that must be empty in between, indexed by start * 64 + end
+            'reach': np.array([[False] * 4096] * 2 + [[between is not None for between in _MOVE_TABLES[name]]
+                                                      for name in 'nbrqk']),
+            'between': np.array(_BETWEEN, dtype=np.uint64),
+        }
+    return _TABLES
+
+
+def _ray_attacks(rays, occupancy):
+    '''
+    gets the squares reached from every square along a set of rays, stopping each ray at the first blocker
+    :param rays: list of (ray table, positive) pairs as in ChessVar._ROOK_RAYS
+    :param occupancy: (N, 1) uint64 array of occupied squares
+    :return: (N, 64) uint64 array
+    '''
+    attacks = np.zeros((occupancy.shape[0], 64), dtype=np.uint64)
+    for ray, positive in rays:
+        blockers = ray[None, :] & occupancy
+        if positive:
+            # lowest set bit
+            first = blockers & (~blockers + np.uint64(1))
+        else:
+            # highest set bit: fill every bit below it, then keep only the top one
+            first = blockers
+            for shift in (1, 2, 4, 8, 16, 32):
+                first = first | (first >> np.uint64(shift))
+            first = first ^ (first >> np.uint64(1))
+        # a power of 2 converts to float exactly, so log2 gives the blocker's square
+        index = np.log2(np.where(first == 0, 1, first).astype(np.float64)).astype(np.intp)
+        attacks |= np.where(blockers == 0, ray[None, :], ray[None, :] ^ ray[index])
+    return attacks
+
+
+class BatchChessVar:
+    '''
+    many ChessVar games stored as arrays: an (N, 8, 8) int8 board, and per game the turn counter, the state and
+    the number of pieces left of each type and color; legal moves and moves are computed for every game at once
+    '''
+
+    def __init__(self, n):
+        '''
+        :param n: number of games, all starting from the starting position
+        '''
+        if np is None:
+            raise ImportError('BatchChessVar needs numpy')
+        _tables()
+        self._n = n
+        start = np.zeros((8, 8), dtype=np.int8)
+        start[0] = [-_CODES[name] for name in _START_ROW]
+        start[1] = -_CODES['p']
+        start[6] = _CODES['p']
+        start[7] = [_CODES[name] for name in _START_ROW]
+        self._board = np.repeat(start[None], n, axis=0)
+        self._turn = np.zeros(n, dtype=np.int32)
+        # 0 for 'UNFINISHED', 1 for 'WHITE_WON', 2 for 'BLACK_WON' and 3 for 'DRAW', which a batch only gets from a
+        # game copied in, as it has no draw rules of its own; every state but 0 is finished
+        self._state = np.zeros(n, dtype=np.int8)
+        # pieces left, indexed by [game, 0 for white and 1 for black, piece code - 1]
+        self._counts = np.tile(np.array(_START_COUNTS, dtype=np.int8), (n, 2, 1))
+
+    @classmethod
+    def from_games(cls, games):
+        '''
+        copies the positions of ChessVar games
+        :param games: list of ChessVar
+        :return: BatchChessVar holding the same positions
+        '''
+        batch = cls(len(games))
+        for i, game in enumerate(games):
+            for row in range(8):
+                for col in range(8):
+                    piece = game._board[row][col]
+                    batch._board[i, row, col] = 0 if piece == '' else \
+                        _CODES[piece.get_name().lower()] * (1 if piece.get_color() == 'white' else -1)
+            batch._turn[i] = game._turn
+            batch._state[i] = _STATES.index(game.get_game_state())
+            for side, pieces in enumerate([(game._p, game._n, game._b, game._r, game._q, game._k),
+                                           (game._P, game._N, game._B, game._R, game._Q, game._K)]):
+                batch._counts[i, side] = [piece.get_num() for piece in pieces]
+        return batch
+
+    def __len__(self):
+        return self._n
+
+    def get_board(self):
+        '''
+        gets the boards, with rows and columns in the same order as ChessVar._board
+        :return: (N, 8, 8) int8 array, 0 for empty, 1 to 6 for white pawn, knight, bishop, rook, queen, king and
+        the negative codes for black
+        '''
+        return self._board
+
+    def get_counts(self):
+        '''
+        gets the number of pieces left of each type and color
+        :return: (N, 2, 6) int8 array indexed by [game, 0 for white and 1 for black, piece code - 1]
+        '''
+        return self._counts
+
+    def get_game_states(self):
+        '''
+        gets the state of every game
+        :return: list of 'UNFINISHED', 'WHITE_WON', 'BLACK_WON' or 'DRAW'
+        '''
+        return [_STATES[state] for state in self._state]
+
+    def _sides(self):
+        '''
+        gets which side is to move and the board seen from that side
+        :return: (side, relative) where side is 0 for white and 1 for black, and relative is the flat board with
+        the pieces of the side to move positive
+        '''
+        side = (self._turn & 1).astype(np.intp)
+        sign = np.where(side == 0, 1, -1).astype(np.int8)
+        return side, self._board.reshape(self._n, 64) * sign[:, None]
+
+    def legal_targets(self):
+        '''
+        computes every legal move of every game as bitboards
+        :return: (N, 64) uint64 array; bit e of [game, s] is set when moving from square s to square e is legal,
+        with squares numbered row * 8 + col like ChessVar
+        '''
+        t = _TABLES
+        side, relative = self._sides()
+        own, opp = relative > 0, relative < 0
+        codes = np.abs(relative)
+        own_bits = np.packbits(own, axis=1, bitorder='little').view('<u8')
+        opp_bits = np.packbits(opp, axis=1, bitorder='little').view('<u8')
+        occupancy = own_bits | opp_bits
+
+        rook = _ray_attacks(t['rook_rays'], occupancy)
+        bishop = _ray_attacks(t['bishop_rays'], occupancy)
+        # pawns move forward onto empty squares, 2 squares only from the starting row, and capture diagonally
+        push = t['push'][side] & ~occupancy
+        pawn = push | (t['capture'][side] & opp_bits)
+        pawn |= np.where(push != 0, t['double'][side] & ~occupancy, np.uint64(0))
+
+        targets = np.select(
+            [codes == 1, codes == 2, codes == 3, codes == 4, codes == 5, codes == 6],
+            [pawn, t['knight'][None, :], bishop, rook, rook | bishop, t['king'][None, :]], np.uint64(0))
+        targets &= ~own_bits
+        targets[~own] = 0
+        targets[self._state != 0] = 0
+        return targets
+
+    def legal_move_masks(self):
+        '''
+        computes every legal move of every game
+        :return: (N, 64, 64) bool array, True at [game, start, end] when the move is legal
+        '''
+        targets = self.legal_targets().astype('<u8')
+        return np.unpackbits(targets.view(np.uint8), axis=-1, bitorder='little').reshape(self._n, 64, 64) != 0
+
+    def step(self, moves):
+        '''
+        makes one move in every game; a game whose move is illegal, or which has finished, is left as it was
+        :param moves: (N, 2) int array of (start, end) square indices
+        :return: (N,) bool array, True where the move was made
+        '''
+        t = _TABLES
+        moves = np.asarray(moves, dtype=np.intp)
+        games = np.arange(self._n)
+        start, end = moves[:, 0], moves[:, 1]
+        side, relative = self._sides()
+        flat = self._board.reshape(self._n, 64)
+        mover, target = relative[games, start], relative[games, end]
+        codes = np.abs(mover).astype(np.intp)
+
+        pair = start * 64 + end
+        bit = np.left_shift(np.uint64(1), end.astype(np.uint64))
+        occupancy = np.packbits(relative != 0, axis=1, bitorder='little').view('<u8')[:, 0]
+
+        pawn_ok = ((((t['push'][side, start] | t['double'][side, start]) & bit) != 0) & (target == 0)) | \
+            (((t['capture'][side, start] & bit) != 0) & (target < 0))
+        ok = np.where(codes == _CODES['p'], pawn_ok, t['reach'][codes, pair] & (target <= 0))
+        ok &= (t['between'][pair] & occupancy) == 0
+        ok &= (mover > 0) & (self._state == 0)
+
+        moved = games[ok]
+        captured = flat[moved, end[ok]]
+        flat[moved, end[ok]] = flat[moved, start[ok]]
+        flat[moved, start[ok]] = 0
+        self._turn[moved] += 1
+
+        # each game captures at most once, so plain fancy indexing is enough to update the counts
+        took = captured != 0
+        victims, victim_codes = moved[took], captured[took]
+        colors = (victim_codes < 0).astype(np.intp)
+        types = np.abs(victim_codes).astype(np.intp) - 1
+        self._counts[victims, colors, types] -= 1
+        won = self._counts[victims, colors, types] == 0
+        # taking the last black piece of a type means white won, and the other way around
+        self._state[victims[won]] = np.where(colors[won] == 1, 1, 2)
+        return ok
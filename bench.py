@@ -0,0 +1,324 @@
+# benchmarks of the ChessVar hot paths, compared against a stored baseline to catch slowdowns
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from ChessVar import ChessVar, BitboardChessVar, perft, _SQUARE_NAMES
+from selfplay import play_game
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+# benchmarks that exist to be faster than another one: the bitboard backend against the list backend, and batch
+# validation against one check at a time
+FASTER = [
+    ('make_move_bitboard', 'make_move'),
+    ('check_move_bitboard', 'check_move'),
+    ('check_moves', 'check_move'),
+    ('check_moves_bitboard', 'check_moves'),
+    ('check_move_codes_bitboard', 'check_moves_bitboard'),
+]
+# fraction of the baseline speed a benchmark may lose; a single core shared with other work easily loses a quarter
+# for a moment, and whatever looks slower is timed again before it counts
+TOLERANCE = 0.35
+
+# the piece put on d4 for the check_legal cases, and the empty board with only the kings around it
+_CHECK_PIECES = {'Queen': 'q', 'Rook': 'r', 'Bishop': 'b', 'Knight': 'n', 'King': 'k', 'Pawn': 'p'}
+_SPARSE = [''] * 64
+_SPARSE[4], _SPARSE[60] = 'K', 'k'
+
+
+def _scripted_games(count=20):
+    '''
+    gets the same random games every run
+    :param count: number of games
+    :return: list of games, each a list of (start, end) pairs
+    '''
+    # without the repetition rule, so the workload stays the same as the baseline's
+    records = [play_game(index, seed=2023, max_plies=200, repetitions=0) for index in range(count)]
+    return [[(move[:2], move[2:]) for move in record['moves'].split()] for record in records]
+
+
+def bench_construct():
+    '''
+    ChessVar() construction
+    :return: (function doing the work, operations it does)
+    '''
+    def run():
+        for _ in range(1000):
+            ChessVar()
+    return run, 1000
+
+
+def bench_make_move(cls=ChessVar):
+    '''
+    make_move() replaying scripted games from the start
+    :return: (function doing the work, operations it does)
+    '''
+    games = _scripted_games()
+
+    def run():
+        for moves in games:
+            game = cls()
+            for start, end in moves:
+                game.make_move(start, end)
+    return run, sum(len(moves) for moves in games)
+
+
+def bench_make_moves():
+    '''
+    make_moves() replaying the same scripted games in one call each
+    :return: (function doing the work, operations it does)
+    '''
+    games = _scripted_games()
+
+    def run():
+        for moves in games:
+            ChessVar().make_moves(moves)
+    return run, sum(len(moves) for moves in games)
+
+
+def _candidate_positions():
+    '''
+    gets positions from the scripted games with every move a piece of the side to move could be asked to make
+    :return: list of (game, candidate moves) pairs, the moves as (start, end) pairs in algebraic notation
+    '''
+    positions = []
+    for moves in _scripted_games(5):
+        game = ChessVar()
+        for ply, (start, end) in enumerate(moves[:40]):
+            game.make_move(start, end)
+            if ply % 4 == 0:
+                color = 'white' if game._turn % 2 == 0 else 'black'
+                starts = [name for sq, name in enumerate(_SQUARE_NAMES)
+                          if game._board[sq >> 3][sq & 7] != '' and game._board[sq >> 3][sq & 7].get_color() == color]
+                positions.append((game.snapshot(), [(start, end) for start in starts for end in _SQUARE_NAMES]))
+    return positions
+
+
+def bench_check_move(cls=ChessVar, batch=None):
+    '''
+    validating every candidate move of positions from the scripted games, one check_move() call at a time or in
+    one call per position
+    :param cls: backend to use
+    :param batch: None for check_move(), 'moves' for check_moves() or 'codes' for check_move_codes() with the moves
+    given as move codes
+    :return: (function doing the work, operations it does)
+    '''
+    positions = [(cls.from_snapshot(snapshot), moves) for snapshot, moves in _candidate_positions()]
+    if batch == 'codes':
+        squares = positions[0][0]._rules.squares
+        positions = [(game, [squares[start] * 64 + squares[end] for start, end in moves]) for game, moves in positions]
+
+    def run():
+        for game, moves in positions:
+            if batch == 'codes':
+                game.check_move_codes(moves)
+            elif batch == 'moves':
+                game.check_moves(moves)
+            else:
+                check_move = game.check_move
+                for start, end in moves:
+                    check_move(start, end)
+    return run, sum(len(moves) for _, moves in positions)
+
+
+def bench_check_legal(piece_class, dense):
+    '''
+    check_legal() of one piece class from d4 to every square, on the starting position with the piece added
+    (dense) or on a board with only the kings (sparse)
+    :param piece_class: name of the class, e.g. 'Queen'
+    :param dense: which board to use
+    :return: (function doing the work, operations it does)
+    '''
+    game = ChessVar()
+    names = [piece.get_name() if piece != '' else '' for row in game._board for piece in row] if dense \
+        else list(_SPARSE)
+    names[35] = _CHECK_PIECES[piece_class]
+    game._load(names, 0, 'UNFINISHED')
+    piece, board = game._board[4][3], game._board
+
+    def run():
+        for _ in range(20):
+            for end in _SQUARE_NAMES:
+                piece.check_legal('d4', end, board)
+    return run, 20 * 64
+
+
+def bench_gen_moves():
+    '''
+    generating the legal moves of positions from the scripted games
+    :return: (function doing the work, operations it does)
+    '''
+    positions = []
+    for moves in _scripted_games(5):
+        game = ChessVar()
+        for start, end in moves[:40]:
+            game.make_move(start, end)
+            positions.append(ChessVar.from_snapshot(game.snapshot()))
+
+    def run():
+        for game in positions:
+            game._gen_moves()
+    return run, len(positions)
+
+
+def bench_perft():
+    '''
+    perft to depth 3 from the starting position, counting leaves
+    :return: (function doing the work, operations it does)
+    '''
+    game = ChessVar()
+    return (lambda: perft(game, 3)), perft(game, 3)
+
+
+def bench_search():
+    '''
+    a depth 3 engine search from an opening position, counting nodes
+    :return: (function doing the work, operations it does)
+    '''
+    game = ChessVar()
+    game.make_moves([('e2', 'e4'), ('d7', 'd5'), ('g1', 'f3')])
+    game.best_move(depth=3)
+    nodes = game.get_search_info()['nodes']
+    # a fresh table every time, so every run searches the same tree
+    return (lambda: ChessVar.from_snapshot(game.snapshot()).best_move(depth=3)), nodes
+
+
+def _cases():
+    '''
+    lists every benchmark
+    :return: dict of name -> function making (work, operations)
+    '''
+    cases = {
+        'construct': bench_construct,
+        'make_move': bench_make_move,
+        'make_move_bitboard': lambda: bench_make_move(BitboardChessVar),
+        'make_moves': bench_make_moves,
+        'check_move': bench_check_move,
+        'check_move_bitboard': lambda: bench_check_move(BitboardChessVar),
+        'check_moves': lambda: bench_check_move(ChessVar, 'moves'),
+        'check_moves_bitboard': lambda: bench_check_move(BitboardChessVar, 'moves'),
+        'check_move_codes_bitboard': lambda: bench_check_move(BitboardChessVar, 'codes'),
+    }
+    for piece_class in _CHECK_PIECES:
+        for dense in (True, False):
+            name = f"check_legal_{piece_class.lower()}_{'dense' if dense else 'sparse'}"
+            cases[name] = lambda piece_class=piece_class, dense=dense: bench_check_legal(piece_class, dense)
+    cases['gen_moves'] = bench_gen_moves
+    cases['perft'] = bench_perft
+    cases['search'] = bench_search
+    return cases
+
+
+def run_benchmarks(names=None, repeat=7):
+    '''
+    times the benchmarks, keeping the best of several runs of each; the runs go round all the cases in turn, so a
+    slow spell of the machine hits every case a little rather than a few cases a lot, and cases compared with each
+    other run under the same conditions
+    :param names: benchmarks to run, all of them by default
+    :param repeat: runs of each
+    :return: dict of name -> operations per second
+    '''
+    cases = {name: case() for name, case in _cases().items() if names is None or name in names}
+    best = {}
+    for _ in range(repeat):
+        for name, (run, _) in cases.items():
+            start_time = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start_time
+            best[name] = min(best.get(name, elapsed), elapsed)
+    return {name: round(operations / best[name], 1) if best[name] > 0 else float('inf')
+            for name, (_, operations) in cases.items()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+    finds the benchmarks that got slower than the baseline by more than the tolerance
+    :param results: dict of name -> operations per second
+    :param baseline: the same for the baseline
+    :param tolerance: fraction of the baseline speed that may be lost
+    :return: list of (name, baseline speed, speed, ratio) for every slowdown; benchmarks missing from either side
+    are skipped
+    '''
+    slower = []
+    for name, speed in results.items():
+        if name in baseline and speed < baseline[name] * (1 - tolerance):
+            slower.append((name, baseline[name], speed, speed / baseline[name]))
+    return slower
+
+
+def compare_backends(results, pairs=FASTER):
+    '''
+    finds the benchmarks that aren't faster than the one they are meant to beat, in the same run, so the check
+    doesn't depend on the machine the baseline was recorded on
+    :param results: dict of name -> operations per second
+    :param pairs: list of (name, name it should be faster than)
+    :return: list of (name, other name, ratio of their speeds) for every pair where the first isn't faster; pairs
+    missing from the results are skipped
+    '''
+    behind = []
+    for name, other in pairs:
+        if name in results and other in results and results[name] <= results[other]:
+            behind.append((name, other, results[name] / results[other]))
+    return behind
+
+
+def main(argv=None):
+    '''
+    command line entry point: runs the benchmarks, prints them next to the baseline and fails on a slowdown or on
+    a benchmark that isn't faster than the one it is meant to beat
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status, 1 if any benchmark got slower than the tolerance allows or fell behind
+    '''
+    parser = argparse.ArgumentParser(prog='python bench.py')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all of them by default')
+    parser.add_argument('--repeat', type=int, default=7, help='runs of each benchmark, the best one counts')
+    parser.add_argument('--out', help='JSON file to write the results to')
+    parser.add_argument('--baseline', default=BASELINE, help='JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='fraction of the baseline speed that may be lost')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names or None, args.repeat)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    # a slowdown or a backend falling behind is only believed if it is still there when timed again, for longer
+    suspects = {name for name, _, _, _ in compare(results, baseline, args.tolerance)}
+    suspects.update(name for pair in compare_backends(results) for name in pair[:2])
+    if suspects:
+        again = run_benchmarks(suspects, 2 * args.repeat)
+        results.update((name, max(speed, results[name])) for name, speed in again.items())
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+
+    for name, speed in results.items():
+        line = f"{name:32} {speed:14,.0f} ops/s"
+        if name in baseline:
+            line += f"  {speed / baseline[name]:6.2f}x baseline"
+        print(line)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+    behind = compare_backends(results)
+    for name, other, ratio in behind:
+        print(f"NOT FASTER: {name} runs at {ratio:.2f}x {other}")
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        return 0
+
+    slower = compare(results, baseline, args.tolerance)
+    for name, old, new, ratio in slower:
+        print(f"SLOWER: {name} {new:,.0f} ops/s against {old:,.0f} in the baseline ({ratio:.2f}x)")
+    return 1 if slower or behind else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
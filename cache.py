@@ -0,0 +1,172 @@
+# SQLite cache of engine results keyed by the ChessVar position key, with an LRU in memory in front
+
+import collections
+import sqlite3
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS analysis (
+    key INTEGER PRIMARY KEY,
+    move TEXT,
+    score INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    nodes INTEGER NOT NULL,
+    stored INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_stored ON analysis (stored);
+'''
+
+# a result only replaces a stored one that was searched no deeper
+_UPSERT = '''
+INSERT INTO analysis (key, move, score, depth, nodes, stored) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET move = excluded.move, score = excluded.score, depth = excluded.depth,
+    nodes = excluded.nodes, stored = excluded.stored
+WHERE excluded.depth >= analysis.depth
+'''
+
+
+def _signed(key):
+    '''
+    converts a 64-bit position key to the signed range SQLite integers use
+    :param key: key from ChessVar.get_key()
+    :return: the same 64 bits as a signed integer
+    '''
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class AnalysisCache:
+    '''
+    engine results (best move, score, depth and node count) stored in a SQLite file by position key, which covers
+    the pieces on the board and the side to move. The file is in WAL mode so any number of processes can read it
+    while one writes; each process should open its own AnalysisCache. Recently used results are also kept in
+    memory, and the file is trimmed to max_entries by dropping the results stored longest ago
+    '''
+
+    def __init__(self, path, memory_size=4096, max_entries=1000000, timeout=10.0):
+        '''
+        :param path: SQLite file, created if it doesn't exist
+        :param memory_size: results kept in memory
+        :param max_entries: results kept in the file
+        :param timeout: seconds to wait for another process holding the write lock
+        '''
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+        self._memory = collections.OrderedDict()
+        self._memory_size = memory_size
+        self._max_entries = max_entries
+        # the newest stored stamp, so results are trimmed oldest first; carried on from what the file holds
+        self._stamp = self._db.execute('SELECT COALESCE(MAX(stored), 0) FROM analysis').fetchone()[0]
+        # the file is only counted every so often, so it may go over max_entries by up to that many results
+        self._trim_every = max(1, min(1000, max_entries // 10))
+        self._since_trim = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _remember(self, key, result):
+        '''
+        puts a result at the front of the memory layer, dropping the least recently used one if it is full
+        :return: nothing
+        '''
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        if len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key, min_depth=0):
+        '''
+        looks up a position
+        :param key: position key from ChessVar.get_key()
+        :param min_depth: shallowest search that will do
+        :return: dict with move ((start, end) pair or None), score (for the player to move), depth and nodes, or
+        None if there is no result that deep
+        '''
+        result = self._memory.get(key)
+        if result is not None and result['depth'] >= min_depth:
+            self._memory.move_to_end(key)
+            self._stats['memory_hits'] += 1
+            return result
+        # the file may have a deeper result, e.g. stored by another process
+        row = self._db.execute('SELECT move, score, depth, nodes FROM analysis WHERE key = ?',
+                               (_signed(key),)).fetchone()
+        if row is None or row[2] < min_depth:
+            self._stats['misses'] += 1
+            return None
+        move, score, depth, nodes = row
+        result = {'move': (move[:2], move[2:]) if move else None, 'score': score, 'depth': depth, 'nodes': nodes}
+        self._remember(key, result)
+        self._stats['disk_hits'] += 1
+        return result
+
+    def put(self, key, move, score, depth, nodes):
+        '''
+        stores a result, unless a deeper one is already stored for the position
+        :param key: position key from ChessVar.get_key()
+        :param move: best move as a (start, end) pair, or None
+        :param score: score for the player to move
+        :param depth: depth searched
+        :param nodes: nodes searched
+        :return: nothing
+        '''
+        result = {'move': move, 'score': score, 'depth': depth, 'nodes': nodes}
+        old = self._memory.get(key)
+        if old is None or old['depth'] <= depth:
+            self._remember(key, result)
+        self._stamp += 1
+        self._db.execute(_UPSERT, (_signed(key), move[0] + move[1] if move else None, score, depth, nodes,
+                                   self._stamp))
+        self._stats['stores'] += 1
+        self._since_trim += 1
+        if self._since_trim >= self._trim_every:
+            self._since_trim = 0
+            self._trim()
+
+    def _trim(self):
+        '''
+        drops the results stored longest ago until the file holds at most max_entries
+        :return: nothing
+        '''
+        extra = self._db.execute('SELECT COUNT(*) FROM analysis').fetchone()[0] - self._max_entries
+        if extra > 0:
+            self._db.execute('DELETE FROM analysis WHERE key IN '
+                             '(SELECT key FROM analysis ORDER BY stored LIMIT ?)', (extra,))
+
+    def analyze(self, game, depth=4):
+        '''
+        gets the engine's result for a game's position, from the cache if it has been searched at least that deep,
+        otherwise by searching with best_move() and storing the result
+        :param game: ChessVar
+        :param depth: depth to search
+        :return: dict as returned by get()
+        '''
+        key = game.get_key()
+        result = self.get(key, depth)
+        if result is None:
+            move = game.best_move(depth=depth)
+            info = game.get_search_info()
+            self.put(key, move, info['score'], info['depth'], info['nodes'])
+            result = self._memory.get(key) or self.get(key)
+        return result
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM analysis').fetchone()[0]
+
+    def get_stats(self):
+        '''
+        gets the lookup counters
+        :return: dict with memory_hits, disk_hits, misses and stores
+        '''
+        return dict(self._stats)
+
+    def close(self):
+        '''
+        trims and closes the file
+        :return: nothing
+        '''
+        self._trim()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,249 @@
+# exports ChessVar positions as NumPy training data, streamed into fixed-size sharded .npy files
+
+import argparse
+import json
+import os
+import sys
+
+try:
+    import numpy as np
+    from numpy.lib.format import open_memmap
+except ImportError:  # numpy is only needed for exporting
+    np = None
+
+from ChessVar import BAD_SQUARE, ChessVar, _COUNT_NAMES
+from game_records import read_games
+
+# the arrays every shard has, by field: dtype and the shape of one position
+#     planes  12x8x8 uint8, one plane per piece name in _COUNT_NAMES order (white pawn first, black king last), 1
+#             on every square holding that piece, rows and columns as in ChessVar._board
+#     turn    uint8, 0 when white is to move and 1 for black
+#     counts  12 uint8, pieces left per piece name in _COUNT_NAMES order
+#     result  int8, how the game ended: 1 if white won, -1 if black won, 0 otherwise
+#     move    int16, the move played from the position as start * 64 + end square index, -1 if none
+FIELDS = {
+    'planes': ('uint8', (12, 8, 8)),
+    'turn': ('uint8', ()),
+    'counts': ('uint8', (12,)),
+    'result': ('int8', ()),
+    'move': ('int16', ()),
+}
+PLANE_NAMES = list(_COUNT_NAMES)
+_RESULTS = {'WHITE_WON': 1, 'BLACK_WON': -1}
+
+
+class ShardWriter:
+    '''
+    streams positions into shards of shard_size positions each, one .npy file per field per shard, named
+    '<prefix>-<shard number>.<field>.npy'. Positions are converted a block at a time with NumPy and written
+    straight into the memory-mapped shard, so only one block is ever held in Python. An index file
+    '<prefix>.json' lists the shards once the writer is closed; the last shard is cut down to the positions it got
+    '''
+
+    def __init__(self, directory, shard_size=65536, prefix='positions', block_size=1024):
+        '''
+        :param directory: directory to write to, created if it doesn't exist
+        :param shard_size: positions per shard
+        :param prefix: start of every file name
+        :param block_size: positions converted at a time
+        '''
+        if np is None:
+            raise ImportError('ShardWriter needs numpy')
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._shard_size = shard_size
+        self._prefix = prefix
+        self._block_size = min(block_size, shard_size)
+        # the block being filled: 64 piece codes, 12 counts and the other fields per position
+        self._codes = bytearray()
+        self._counts = bytearray()
+        self._turns = []
+        self._results = []
+        self._moves = []
+        # the shard being written and how many positions it has
+        self._shard = None
+        self._filled = 0
+        self._shards = []
+        self._positions = 0
+
+    def _path(self, number, field):
+        '''
+        :return: path of one field's file of a shard
+        '''
+        return os.path.join(self._directory, f"{self._prefix}-{number:05d}.{field}.npy")
+
+    def add(self, game, result, move=None):
+        '''
+        adds the current position of a game
+        :param game: ChessVar
+        :param result: final state of the game the position comes from, e.g. 'WHITE_WON'
+        :param move: the move played from the position as a (start, end) square index pair, or None
+        :return: nothing
+        '''
+        snapshot = game.snapshot()
+        self._codes += snapshot.board
+        self._counts += snapshot.counts
+        self._turns.append(snapshot.turn % 2)
+        self._results.append(_RESULTS.get(result, 0))
+        self._moves.append(move[0] * 64 + move[1] if move is not None else -1)
+        if len(self._turns) >= self._block_size:
+            self._flush()
+
+    def add_game(self, moves, result):
+        '''
+        replays a game from the starting position, adding the position before every move
+        :param moves: list of (start, end) pairs in algebraic notation or 'e2e4' style strings
+        :param result: final state of the game
+        :return: number of positions added
+        '''
+        game = ChessVar()
+        squares = game._rules.squares
+        for ply, move in enumerate(moves, 1):
+            start, end = (move[:2], move[2:]) if isinstance(move, str) else move
+            s_sq, e_sq = squares.get(start), squares.get(end)
+            # each ply is checked once, and _push() then makes it without checking it again
+            reason = BAD_SQUARE if s_sq is None or e_sq is None else game._check_idx(s_sq, e_sq)
+            if reason is not None:
+                raise ValueError(f"ply {ply}: {start}{end} can't be made: {reason}")
+            self.add(game, result, (s_sq, e_sq))
+            game._push(s_sq, e_sq)
+        return len(moves)
+
+    def _flush(self):
+        '''
+        converts the block into arrays and writes it into the shard, starting new shards as they fill up
+        :return: nothing
+        '''
+        count = len(self._turns)
+        if count == 0:
+            return
+        codes = np.frombuffer(bytes(self._codes), dtype=np.uint8).reshape(count, 64)
+        # one plane per piece code 1 to 12, all compared at once
+        planes = (codes[:, None, :] == np.arange(1, 13, dtype=np.uint8)[None, :, None]).view(np.uint8)
+        block = {
+            'planes': planes.reshape(count, 12, 8, 8),
+            'turn': np.array(self._turns, dtype=np.uint8),
+            'counts': np.frombuffer(bytes(self._counts), dtype=np.uint8).reshape(count, 12),
+            'result': np.array(self._results, dtype=np.int8),
+            'move': np.array(self._moves, dtype=np.int16),
+        }
+        self._codes, self._counts = bytearray(), bytearray()
+        self._turns, self._results, self._moves = [], [], []
+
+        done = 0
+        while done < count:
+            if self._shard is None:
+                number = len(self._shards)
+                self._shard = {field: open_memmap(self._path(number, field), mode='w+', dtype=dtype,
+                                                  shape=(self._shard_size,) + shape)
+                               for field, (dtype, shape) in FIELDS.items()}
+                self._filled = 0
+            take = min(count - done, self._shard_size - self._filled)
+            for field, array in self._shard.items():
+                array[self._filled:self._filled + take] = block[field][done:done + take]
+            self._filled += take
+            self._positions += take
+            done += take
+            if self._filled == self._shard_size:
+                self._finish_shard()
+
+    def _finish_shard(self):
+        '''
+        flushes the shard to disk, first cutting it down to the positions it got if it isn't full
+        :return: nothing
+        '''
+        number = len(self._shards)
+        for field, array in self._shard.items():
+            array.flush()
+            if self._filled < self._shard_size:
+                # a .npy header holds the shape, so a short shard is rewritten with the right one
+                path = self._path(number, field)
+                np.save(path + '.tmp.npy', array[:self._filled])
+                os.replace(path + '.tmp.npy', path)
+        self._shard = None
+        self._shards.append({'number': number, 'positions': self._filled})
+
+    def close(self):
+        '''
+        writes what is left and the index file
+        :return: dict with the number of positions and shards written
+        '''
+        self._flush()
+        if self._shard is not None:
+            self._finish_shard()
+        index = {
+            'fields': {field: {'dtype': dtype, 'shape': list(shape)} for field, (dtype, shape) in FIELDS.items()},
+            'plane_names': PLANE_NAMES,
+            'shard_size': self._shard_size,
+            'shards': self._shards,
+        }
+        with open(os.path.join(self._directory, f"{self._prefix}.json"), 'w') as f:
+            json.dump(index, f, indent=2)
+            f.write('\n')
+        return {'positions': self._positions, 'shards': len(self._shards)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_shards(directory, prefix='positions'):
+    '''
+    opens every shard of an export read-only and memory-mapped, so nothing is read until it is used
+    :param directory: directory the export was written to
+    :param prefix: prefix it was written with
+    :return: list of dicts of field -> array, one per shard
+    '''
+    if np is None:
+        raise ImportError('load_shards needs numpy')
+    with open(os.path.join(directory, f"{prefix}.json")) as f:
+        index = json.load(f)
+    return [{field: np.load(os.path.join(directory, f"{prefix}-{shard['number']:05d}.{field}.npy"), mmap_mode='r')
+             for field in index['fields']} for shard in index['shards']]
+
+
+def _read_records(lines):
+    '''
+    reads games from self-play JSON lines or from game records, telling them apart line by line
+    :param lines: iterable of lines
+    :return: generator of (moves, result)
+    '''
+    for line in lines:
+        if line.lstrip().startswith('{'):
+            record = json.loads(line)
+            yield record['moves'].split(), record['result']
+        else:
+            for _, moves, result in read_games([line]):
+                yield moves, result
+
+
+def main(argv=None):
+    '''
+    command line entry point: exports every position of a file of games
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status
+    '''
+    parser = argparse.ArgumentParser(prog='python export.py')
+    parser.add_argument('path', help='self-play JSON lines or game records')
+    parser.add_argument('directory', help='directory to write the shards to')
+    parser.add_argument('--shard-size', type=int, default=65536, help='positions per shard')
+    parser.add_argument('--prefix', default='positions')
+    args = parser.parse_args(argv)
+
+    games = 0
+    writer = ShardWriter(args.directory, args.shard_size, args.prefix)
+    try:
+        with open(args.path) as lines:
+            for moves, result in _read_records(lines):
+                writer.add_game(moves, result)
+                games += 1
+    finally:
+        stats = writer.close()
+    print(f"{games} games, {stats['positions']} positions in {stats['shards']} shards")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# reads, writes and replays ChessVar game records, one game per line
+
+import argparse
+import collections
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessVar import ChessVar, Variant, STANDARD
+
+# a record is the moves, each the start square followed by the end square, then the result, e.g.
+#     e2e4 e7e5 d1h5 b8c6 h5f7 WHITE_WON
+# DRAW is a game stopped by a repetition or ply limit, which the standard rules don't have; the record doesn't say
+# which, so records are replayed under the standard rules unless the caller gives the draw rules they were played
+# with (e.g. self-play's, the third repetition or 400 plies), and a DRAW has to be one the moves actually reach
+RESULTS = ('UNFINISHED', 'WHITE_WON', 'BLACK_WON', 'DRAW')
+# reasons a record can fail, on top of the ones from ChessVar.check_move()
+MALFORMED_MOVE = 'MALFORMED_MOVE'
+BAD_RESULT = 'BAD_RESULT'
+RESULT_MISMATCH = 'RESULT_MISMATCH'
+# the compiled draw rules by (repetitions, max_plies), so a worker builds them once rather than once per chunk
+_DRAW_RULES = {}
+
+Replay = collections.namedtuple('Replay', ['line', 'ok', 'ply', 'reason'])
+Replay.__doc__ = '''
+result of replaying one record: the line it came from, whether it replayed cleanly, the number of the first bad
+ply (1 for the first move, or the ply after the last move for a result problem) and the reason it failed
+'''
+
+
+def format_game(moves, result):
+    '''
+    makes a record line
+    :param moves: list of (start, end) pairs or 'e2e4' style strings
+    :param result: 'UNFINISHED', 'WHITE_WON', 'BLACK_WON' or 'DRAW'
+    :return: the line, without a newline
+    '''
+    return ' '.join([move if isinstance(move, str) else move[0] + move[1] for move in moves] + [result])
+
+
+def write_games(out, games):
+    '''
+    writes records
+    :param out: text file open for writing
+    :param games: iterable of (moves, result) pairs as taken by format_game()
+    :return: number of records written
+    '''
+    count = 0
+    for moves, result in games:
+        out.write(format_game(moves, result) + '\n')
+        count += 1
+    return count
+
+
+def read_games(lines):
+    '''
+    splits records into moves and result, one line at a time, skipping blank lines and lines starting with '#'
+    :param lines: iterable of lines, such as an open text file
+    :return: generator of (line number, list of move strings, result string)
+    '''
+    for number, line in enumerate(lines, 1):
+        tokens = line.split()
+        if not tokens or tokens[0].startswith('#'):
+            continue
+        yield number, tokens[:-1], tokens[-1]
+
+
+def draw_rules(repetitions=0, max_plies=0):
+    '''
+    gets the variant records are replayed under
+    :param repetitions: times a position has to come up for the game to be drawn, 0 for never
+    :param max_plies: plies after which the game is drawn, 0 for no limit
+    :return: Variant, shared between calls with the same limits; STANDARD when there are no draw rules
+    '''
+    if not repetitions and not max_plies:
+        return STANDARD
+    rules = _DRAW_RULES.get((repetitions, max_plies))
+    if rules is None:
+        rules = _DRAW_RULES[repetitions, max_plies] = Variant(name='records', repetitions=repetitions,
+                                                              max_plies=max_plies)
+    return rules
+
+
+def replay(moves, result, line=0, rules=None):
+    '''
+    replays a record through ChessVar.make_moves and finds the first ply that doesn't work
+    :param moves: list of 'e2e4' style move strings
+    :param result: the recorded result
+    :param line: line number to put in the answer
+    :param rules: Variant with the draw rules the game was played under, STANDARD by default
+    :return: Replay
+    '''
+    if result not in RESULTS:
+        return Replay(line, False, len(moves) + 1, BAD_RESULT)
+    # the moves up to the first malformed one, split into squares
+    pairs = []
+    for move in moves:
+        if len(move) != 4:
+            break
+        pairs.append((move[:2], move[2:]))
+    game = ChessVar(rules)
+    # make_moves() checks each move once and gives the reason for the first it can't make
+    count, reason = game.make_moves(pairs)
+    if reason is not None:
+        return Replay(line, False, count + 1, reason)
+    if len(pairs) < len(moves):
+        return Replay(line, False, len(pairs) + 1, MALFORMED_MOVE)
+    state = game.get_game_state()
+    if state != result:
+        return Replay(line, False, len(moves) + 1, RESULT_MISMATCH)
+    return Replay(line, True, None, None)
+
+
+def _replay_chunk(records, repetitions, max_plies):
+    '''
+    replays a list of records, in a worker process
+    :param records: list of (line number, moves, result)
+    :param repetitions: repetitions for draw_rules()
+    :param max_plies: ply limit for draw_rules()
+    :return: list of Replay
+    '''
+    rules = draw_rules(repetitions, max_plies)
+    return [replay(moves, result, number, rules) for number, moves, result in records]
+
+
+def _chunks(records, size):
+    '''
+    groups records into lists without reading ahead more than one list
+    :return: generator of lists
+    '''
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate(lines, workers=1, chunk_size=1000, repetitions=0, max_plies=0):
+    '''
+    replays every record, streaming: only the chunks being replayed are held in memory, and answers come back in
+    the order of the records
+    :param lines: iterable of lines, such as an open text file
+    :param workers: number of worker processes; 1 replays in this process
+    :param chunk_size: records sent to a worker at a time
+    :param repetitions: times a position has to come up for a game to be drawn, 0 for never as in the standard rules
+    :param max_plies: plies after which a game is drawn, 0 for no limit as in the standard rules
+    :return: generator of Replay, one per record
+    '''
+    records = read_games(lines)
+    if workers <= 1:
+        rules = draw_rules(repetitions, max_plies)
+        for number, moves, result in records:
+            yield replay(moves, result, number, rules)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for chunk in _chunks(records, chunk_size):
+            pending.append(pool.submit(_replay_chunk, chunk, repetitions, max_plies))
+            # keep a couple of chunks per worker in flight
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    '''
+    command line entry point: prints every record that fails and a summary
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status, 1 if any record failed
+    '''
+    parser = argparse.ArgumentParser(prog='python game_records.py')
+    parser.add_argument('path', help="file of records, or '-' for stdin")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--repetitions', type=int, default=0,
+                        help='times a position comes up for a draw, 0 for never (the default)')
+    parser.add_argument('--max-plies', type=int, default=0,
+                        help='plies after which a game is drawn, 0 for no limit (the default)')
+    args = parser.parse_args(argv)
+
+    lines = sys.stdin if args.path == '-' else open(args.path)
+    total = failed = 0
+    with lines:
+        for answer in validate(lines, args.workers, args.chunk_size, args.repetitions, args.max_plies):
+            total += 1
+            if not answer.ok:
+                failed += 1
+                print(f"line {answer.line}: ply {answer.ply}: {answer.reason}")
+    print(f"{total} games, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
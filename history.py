@@ -0,0 +1,142 @@
+# move history of a ChessVar game with periodic checkpoints, for jumping to any ply quickly
+
+from array import array
+
+from ChessVar import ChessVar
+
+
+class GameHistory:
+    '''
+    every move of a game, 2 bytes each, plus a Snapshot of the position every interval plies. Any ply is reached
+    from the nearest checkpoint at or before it plus fewer than interval moves, or by stepping the position last
+    reached back or forward when that is closer. Once there are more than max_checkpoints checkpoints, every
+    other one is dropped and the interval doubles, so a game never holds more than that many whatever its length
+    '''
+
+    def __init__(self, interval=16, max_checkpoints=64, variant=None, start=None):
+        '''
+        :param interval: plies between checkpoints
+        :param max_checkpoints: most checkpoints kept
+        :param variant: Variant the game is played under, STANDARD by default
+        :param start: Snapshot of the position the game starts from, the variant's starting position by default
+        '''
+        self._interval = interval
+        self._max_checkpoints = max_checkpoints
+        # the game at the last ply, which checks every move added
+        self._head = ChessVar(variant) if start is None else ChessVar.from_snapshot(start, variant)
+        self._names = self._head._rules.names
+        # start * 64 + end of every move
+        self._moves = array('H')
+        # checkpoint i is the position at ply i * interval
+        self._checkpoints = [self._head.snapshot()]
+        # the game seek() moves around, the ply it is at and the ply it was last loaded at, below which it can't pop
+        self._cursor = ChessVar(variant)
+        self._cursor._load_snapshot(self._checkpoints[0])
+        self._cursor_ply = 0
+        self._cursor_base = 0
+
+    @classmethod
+    def from_moves(cls, moves, **options):
+        '''
+        records a whole game
+        :param moves: iterable of (start, end) pairs in algebraic notation or 'e2e4' style strings
+        :param options: keyword arguments for GameHistory()
+        :return: GameHistory; raises ValueError at the first move that can't be made
+        '''
+        history = cls(**options)
+        for ply, move in enumerate(moves, 1):
+            start, end = (move[:2], move[2:]) if isinstance(move, str) else move
+            if not history.append(start, end):
+                raise ValueError(f"ply {ply}: {start}{end} can't be made: {history._head.check_move(start, end)}")
+        return history
+
+    def __len__(self):
+        return len(self._moves)
+
+    def append(self, start, end):
+        '''
+        adds a move at the end of the game, if it can be made there
+        :param start: the square we are starting with
+        :param end: the square we are moving the piece into
+        :return: false if the move is invalid, true if otherwise
+        '''
+        head = self._head
+        if not head.make_move(start, end):
+            return False
+        squares = head._rules.squares
+        self._moves.append(squares[start] * 64 + squares[end])
+        if len(self._moves) % self._interval == 0:
+            self._checkpoints.append(head.snapshot())
+            if len(self._checkpoints) > self._max_checkpoints:
+                # keep the even checkpoints, which are the multiples of the doubled interval
+                self._checkpoints = self._checkpoints[::2]
+                self._interval *= 2
+        return True
+
+    def get_moves(self):
+        '''
+        gets every move of the game
+        :return: list of (start, end) pairs in algebraic notation
+        '''
+        names = self._names
+        return [(names[move >> 6], names[move & 63]) for move in self._moves]
+
+    def get_game(self):
+        '''
+        gets the game at its last ply
+        :return: ChessVar, which must not be changed except through append()
+        '''
+        return self._head
+
+    def seek(self, ply):
+        '''
+        sets up the position after a number of plies
+        :param ply: 0 for the starting position up to len(self) for the last one; negative counts from the end
+        :return: ChessVar at that position, shared between calls, so it is only good until the next seek() and
+        must not be changed; fork() it to play on from there
+        '''
+        if ply < 0:
+            ply += len(self._moves)
+        if not 0 <= ply <= len(self._moves):
+            raise IndexError(f"ply {ply} is out of range 0 to {len(self._moves)}")
+        cursor = self._cursor
+        checkpoint = ply // self._interval
+        # moves to make from the checkpoint, against moves to take back or make from where the cursor is
+        from_checkpoint = ply - checkpoint * self._interval
+        if ply == self._cursor_ply:
+            pass
+        elif ply == len(self._moves) and self._head.get_game_state() != 'UNFINISHED':
+            # the last move may have ended the game on a repetition, which the moves since a checkpoint can't show
+            cursor._load_snapshot(self._head.snapshot())
+            self._cursor_base = ply
+        elif self._cursor_base <= ply < self._cursor_ply and self._cursor_ply - ply <= from_checkpoint:
+            for _ in range(self._cursor_ply - ply):
+                cursor._pop()
+        elif self._cursor_ply < ply and ply - self._cursor_ply <= from_checkpoint:
+            # only ever within one checkpoint's stretch of moves, so the cursor holds fewer than interval to pop
+            self._play(self._cursor_ply, ply)
+        else:
+            cursor._load_snapshot(self._checkpoints[checkpoint])
+            self._cursor_base = checkpoint * self._interval
+            self._play(self._cursor_base, ply)
+        self._cursor_ply = ply
+        return cursor
+
+    def _play(self, first, last):
+        '''
+        makes the recorded moves from one ply to another on the cursor
+        :param first: ply the cursor is at
+        :param last: ply to stop at
+        :return: nothing
+        '''
+        push = self._cursor._push
+        for move in self._moves[first:last]:
+            push(move >> 6, move & 63)
+
+    def snapshot(self, ply):
+        '''
+        copies the position after a number of plies
+        :param ply: as in seek()
+        :return: Snapshot
+        '''
+        return self.seek(ply).snapshot()
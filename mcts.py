@@ -0,0 +1,232 @@
+# Monte Carlo tree search player for ChessVar, with tree reuse between moves and parallel search
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessVar import ChessVar, STANDARD
+
+
+class _Node:
+    '''
+    one position in the search tree, reached by playing move from its parent
+    '''
+    __slots__ = ('move', 'parent', 'mover', 'key', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move, parent, mover, key):
+        '''
+        :param move: (start, end) square index pair leading here, None for the root
+        :param parent: parent node, None for the root
+        :param mover: color that played move, None for the root
+        :param key: zobrist key of the position
+        '''
+        self.move = move
+        self.parent = parent
+        self.mover = mover
+        self.key = key
+        self.children = []
+        # moves not expanded yet, None until the node is first visited
+        self.untried = None
+        self.visits = 0
+        # playouts won by mover, counting an unfinished playout as half
+        self.wins = 0.0
+
+
+def _grow(game, root, deadline, rollout_plies, exploration, rng):
+    '''
+    runs playouts from root until the deadline: select with UCT, expand one move, play random moves until the game
+    ends or rollout_plies is reached, then back the result up the path; a draw counts like an unfinished playout
+    :param game: game at the root position; it is left there
+    :param root: _Node of that position
+    :param deadline: time.time() to stop at
+    :param rollout_plies: most random moves in a playout
+    :param exploration: UCT exploration constant
+    :param rng: random.Random
+    :return: number of playouts
+    '''
+    playouts = 0
+    while True:
+        # the clock is only read every few playouts
+        if playouts % 16 == 0 and time.time() >= deadline:
+            return playouts
+        node, plies = root, 0
+        # selection: go down through nodes that have every move expanded
+        while node.untried is not None and not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: child.wins / child.visits +
+                       exploration * math.sqrt(log_visits / child.visits))
+            game._push(*node.move)
+            plies += 1
+        # expansion
+        if game._state == 'UNFINISHED':
+            if node.untried is None:
+                node.untried = game._gen_moves()
+                rng.shuffle(node.untried)
+            if node.untried:
+                move = node.untried.pop()
+                mover = 'white' if game._turn % 2 == 0 else 'black'
+                game._push(*move)
+                plies += 1
+                child = _Node(move, node, mover, game._key)
+                node.children.append(child)
+                node = child
+        # rollout
+        for _ in range(rollout_plies):
+            if game._state != 'UNFINISHED':
+                break
+            moves = game._gen_moves()
+            if not moves:
+                break
+            game._push(*rng.choice(moves))
+            plies += 1
+        state = game._state
+        for _ in range(plies):
+            game._pop()
+        # backpropagation, from the point of view of the color that moved into each node
+        while node is not None:
+            node.visits += 1
+            if state == 'UNFINISHED' or state == 'DRAW':
+                node.wins += 0.5
+            elif (state == 'WHITE_WON') == (node.mover == 'white'):
+                node.wins += 1
+            node = node.parent
+        playouts += 1
+
+
+def _root_game(snapshot, variant, seen):
+    '''
+    sets up the game a tree is grown from
+    :param snapshot: Snapshot of the position
+    :param variant: Variant the game is played under, None for STANDARD
+    :param seen: the game's count of every position by key, so playouts draw on repetition where the game would
+    :return: ChessVar
+    '''
+    game = ChessVar.from_snapshot(snapshot, variant)
+    game._seen = dict(seen)
+    return game
+
+
+def _search_tree(snapshot, variant, seen, deadline, rollout_plies, exploration, seed):
+    '''
+    grows a fresh tree from a position, in a worker process
+    :return: (playouts, {move: (visits, wins)} for the root's children)
+    '''
+    root = _Node(None, None, None, 0)
+    playouts = _grow(_root_game(snapshot, variant, seen), root, deadline, rollout_plies, exploration,
+                     random.Random(seed))
+    return playouts, {child.move: (child.visits, child.wins) for child in root.children}
+
+
+class MCTSPlayer:
+    '''
+    picks moves with Monte Carlo tree search under a wall-clock budget. The tree is kept between moves, so the part
+    below the position actually reached is reused. With more than one worker, every extra worker process grows its
+    own tree from the same position (root parallelization) and the visit counts at the root are added up
+    '''
+
+    def __init__(self, time_limit=1.0, rollout_plies=100, exploration=1.4, workers=1, seed=0):
+        '''
+        :param time_limit: seconds to spend on every move
+        :param rollout_plies: random moves after which a playout stops and counts as half a win for both sides
+        :param exploration: UCT exploration constant
+        :param workers: processes searching, including this one
+        :param seed: seed of the random moves
+        '''
+        self._time_limit = time_limit
+        self._rollout_plies = rollout_plies
+        self._exploration = exploration
+        self._workers = workers
+        self._pool = None
+        self._rng = random.Random(seed)
+        self._root = None
+        self._stats = None
+
+    def _find_root(self, key):
+        '''
+        looks for the position in the tree kept from the last move, at its root or one or two plies below
+        :param key: zobrist key of the position
+        :return: _Node, or None if it isn't there
+        '''
+        if self._root is None:
+            return None
+        if self._root.key == key:
+            return self._root
+        for child in self._root.children:
+            if child.key == key:
+                return child
+            for grandchild in child.children:
+                if grandchild.key == key:
+                    return grandchild
+        return None
+
+    def choose_move(self, game):
+        '''
+        searches the position of a game for time_limit seconds
+        :param game: ChessVar to move in; it isn't changed
+        :return: the move as a (start, end) pair in algebraic notation, or None if there is no legal move
+        '''
+        start_time = time.time()
+        deadline = start_time + self._time_limit
+        key = game.get_key()
+        root = self._find_root(key)
+        reused = root.visits if root is not None else 0
+        if root is None:
+            root = _Node(None, None, None, key)
+        root.parent = None
+        snapshot = game.snapshot()
+        # the standard rules are already in every worker, so only another variant is sent along
+        variant = game._rules if game._rules is not STANDARD else None
+        seen = game._seen if game._rules.draws else {}
+
+        futures = []
+        if self._workers > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._workers - 1)
+            futures = [self._pool.submit(_search_tree, snapshot, variant, seen, deadline, self._rollout_plies,
+                                         self._exploration, self._rng.getrandbits(32))
+                       for _ in range(self._workers - 1)]
+        playouts = _grow(_root_game(snapshot, variant, seen), root, deadline, self._rollout_plies,
+                         self._exploration, self._rng)
+        totals = {child.move: [child.visits, child.wins] for child in root.children}
+        for future in futures:
+            count, children = future.result()
+            playouts += count
+            for move, (visits, wins) in children.items():
+                total = totals.setdefault(move, [0, 0.0])
+                total[0] += visits
+                total[1] += wins
+
+        self._root = root
+        elapsed = time.time() - start_time
+        names = game._rules.names
+        self._stats = {
+            'playouts': playouts,
+            'reused': reused,
+            'seconds': elapsed,
+            'playouts_per_second': playouts / elapsed if elapsed > 0 else 0.0,
+            'moves': {names[s_sq] + names[e_sq]: tuple(total)
+                      for (s_sq, e_sq), total in totals.items()},
+        }
+        if not totals:
+            return None
+        # the most visited move is the most robust choice
+        s_sq, e_sq = max(totals, key=lambda move: totals[move][0])
+        return names[s_sq], names[e_sq]
+
+    def get_stats(self):
+        '''
+        gets the details of the last choose_move()
+        :return: dict with playouts, reused (visits kept from the last move), seconds, playouts_per_second and
+        moves ('e2e4' -> (visits, wins)), or None
+        '''
+        return self._stats
+
+    def close(self):
+        '''
+        shuts down the worker processes
+        :return: nothing
+        '''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
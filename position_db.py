@@ -0,0 +1,119 @@
+# append-only files of fixed-width binary ChessVar positions, read back through mmap
+
+import mmap
+import os
+
+from ChessVar import ChessVar, _RECORD_SIZE
+
+RECORD_SIZE = _RECORD_SIZE
+
+
+class PositionWriter:
+    '''
+    appends positions to a file in the ChessVar.to_bytes() format, one fixed-width record after another
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: file to append to, created if it doesn't exist
+        '''
+        self._file = open(path, 'ab')
+
+    def write(self, position):
+        '''
+        appends one position
+        :param position: a ChessVar, or bytes made by ChessVar.to_bytes()
+        :return: nothing
+        '''
+        data = position.to_bytes() if isinstance(position, ChessVar) else position
+        if len(data) != RECORD_SIZE:
+            raise ValueError(f"position records are {RECORD_SIZE} bytes, not {len(data)}")
+        self._file.write(data)
+
+    def write_many(self, positions):
+        '''
+        appends several positions
+        :param positions: iterable of ChessVar or bytes
+        :return: nothing
+        '''
+        for position in positions:
+            self.write(position)
+
+    def close(self):
+        '''
+        flushes and closes the file
+        :return: nothing
+        '''
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PositionReader:
+    '''
+    maps a position file into memory so any record can be read by index without parsing the rest of the file
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: file written by PositionWriter; records appended after opening are not seen
+        '''
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # an empty file can't be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._len = size // RECORD_SIZE
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        '''
+        gets one record
+        :param i: record number, negative to count from the end
+        :return: the record's bytes
+        '''
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('position index out of range')
+        return self._map[i * RECORD_SIZE:(i + 1) * RECORD_SIZE]
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._map[i * RECORD_SIZE:(i + 1) * RECORD_SIZE]
+
+    def get_game(self, i, cls=ChessVar):
+        '''
+        decodes one record into a game
+        :param i: record number
+        :param cls: ChessVar or a subclass such as BitboardChessVar
+        :return: the game
+        '''
+        return cls.from_bytes(self[i])
+
+    def get_buffer(self):
+        '''
+        gets the mapped file, e.g. for numpy.frombuffer(reader.get_buffer(), dtype='u1').reshape(-1, RECORD_SIZE)
+        :return: read-only buffer of the whole file
+        '''
+        return self._map
+
+    def close(self):
+        '''
+        unmaps and closes the file
+        :return: nothing
+        '''
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,135 @@
+# plays ChessVar games against itself across worker processes and streams the records to disk
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ChessVar import ChessVar, Variant
+
+# the compiled draw rules by (repetitions, max_plies), so a worker builds them once rather than once per game
+_DRAW_RULES = {}
+
+
+def play_game(index, seed=0, player='random', max_plies=400, depth=2, random_plies=4, repetitions=3):
+    '''
+    plays one game from the starting position
+    :param index: number of the game, which together with seed decides every random choice in it
+    :param seed: seed of the whole run
+    :param player: 'random' to pick uniformly among the legal moves, 'engine' to use ChessVar.best_move()
+    :param max_plies: plies after which the game is drawn, 0 for no limit
+    :param depth: search depth of the engine player
+    :param random_plies: opening plies the engine player picks at random, so its games differ
+    :param repetitions: times a position has to come up for the game to be drawn, 0 for never
+    :return: dict with the game number, moves, result and ply count
+    '''
+    # seeding with a string is stable across processes and runs, unlike hash()
+    rng = random.Random(f"{seed}:{index}")
+    rules = _DRAW_RULES.get((repetitions, max_plies))
+    if rules is None:
+        rules = _DRAW_RULES[repetitions, max_plies] = Variant(name='selfplay', repetitions=repetitions,
+                                                              max_plies=max_plies)
+    # the game itself ends dead games, with a DRAW
+    game = ChessVar(rules)
+    moves = []
+    while game.get_game_state() == 'UNFINISHED':
+        legal = list(game.legal_moves())
+        if not legal:
+            break
+        if player == 'random' or len(moves) < random_plies:
+            move = rng.choice(legal)
+        else:
+            move = game.best_move(depth=depth)
+        game.make_move(move[0], move[1])
+        moves.append(move[0] + move[1])
+    return {'game': index, 'moves': ' '.join(moves), 'result': game.get_game_state(), 'plies': len(moves)}
+
+
+def _play_chunk(first, count, options):
+    '''
+    plays a run of consecutive games, in a worker process
+    :param first: number of the first game
+    :param count: number of games
+    :param options: keyword arguments for play_game()
+    :return: list of game records
+    '''
+    return [play_game(index, **options) for index in range(first, first + count)]
+
+
+def run_selfplay(num_games, path, workers=None, chunk_size=64, **options):
+    '''
+    plays games split into chunks across a process pool and appends every finished chunk to a JSON lines file as
+    soon as it comes back, so only the chunks in flight are held in memory
+    :param num_games: number of games to play
+    :param path: file to write one JSON record per game to
+    :param workers: number of worker processes, os.cpu_count() by default; 1 plays in this process
+    :param chunk_size: games per task sent to a worker
+    :param options: keyword arguments for play_game()
+    :return: dict with the number of games, results, seconds taken and games per second
+    '''
+    workers = workers or os.cpu_count() or 1
+    chunks = [(first, min(chunk_size, num_games - first)) for first in range(0, num_games, chunk_size)]
+    stats = {'games': 0, 'WHITE_WON': 0, 'BLACK_WON': 0, 'DRAW': 0, 'UNFINISHED': 0}
+    start_time = time.perf_counter()
+
+    with open(path, 'w') as out:
+        def write(records):
+            for record in records:
+                out.write(json.dumps(record) + '\n')
+                stats['games'] += 1
+                stats[record['result']] = stats.get(record['result'], 0) + 1
+
+        if workers == 1:
+            for first, count in chunks:
+                write(_play_chunk(first, count, options))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = set()
+                # keep a couple of chunks queued per worker instead of submitting everything up front
+                for first, count in chunks:
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            write(future.result())
+                    pending.add(pool.submit(_play_chunk, first, count, options))
+                for future in wait(pending).done:
+                    write(future.result())
+
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['games_per_second'] = stats['games'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    return stats
+
+
+def main(argv=None):
+    '''
+    command line entry point
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status
+    '''
+    parser = argparse.ArgumentParser(prog='python selfplay.py')
+    parser.add_argument('games', type=int, help='number of games to play')
+    parser.add_argument('path', help='JSON lines file to write the games to')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, one per core by default')
+    parser.add_argument('--chunk-size', type=int, default=64, help='games per task sent to a worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--player', choices=['random', 'engine'], default='random')
+    parser.add_argument('--depth', type=int, default=2, help='search depth of the engine player')
+    parser.add_argument('--max-plies', type=int, default=400, help='plies after which a game is drawn, 0 for no limit')
+    parser.add_argument('--repetitions', type=int, default=3,
+                        help='times a position has to come up for the game to be drawn, 0 for never')
+    args = parser.parse_args(argv)
+
+    stats = run_selfplay(args.games, args.path, args.workers, args.chunk_size, seed=args.seed,
+                         player=args.player, depth=args.depth, max_plies=args.max_plies,
+                         repetitions=args.repetitions)
+    print(f"{stats['games']} games in {stats['seconds']:.2f} s, {stats['games_per_second']:.1f} games/s")
+    print(f"white won {stats['WHITE_WON']}, black won {stats['BLACK_WON']}, drawn {stats['DRAW']}, "
+          f"unfinished {stats['UNFINISHED']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
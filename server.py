@@ -0,0 +1,281 @@
+# asyncio server hosting many ChessVar games over a JSON lines protocol, plus a load testing client
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessVar import ChessVar, enable_metrics, get_metrics, _SQUARE_NAMES
+
+# every request is one JSON object per line, and gets exactly one JSON object back per line, in order; the "id"
+# of a request, if any, is copied into its response
+#     {"op": "new"}                                          -> {"game": 1}
+#     {"op": "move", "game": 1, "start": "e2", "end": "e4"}  -> {"ok": true, "reason": null, "state": "UNFINISHED"}
+#     {"op": "moves", "game": 1, "moves": ["e7e5", ...]}     -> {"made": 2, "reason": null, "state": "UNFINISHED"}
+#     {"op": "state", "game": 1}                             -> {"state": "UNFINISHED", "turn": "black"}
+#     {"op": "board", "game": 1}                             -> {"board": ["R", "N", ..., "r"]} in square order
+#     {"op": "best", "game": 1, "depth": 3}                  -> {"move": ["d2", "d4"], "score": 0}
+#     {"op": "close", "game": 1}                             -> {"ok": true}
+#     {"op": "metrics"}                                      -> {"metrics": {...}} as in Metrics.snapshot()
+# a request that can't be served gets {"error": "..."} instead
+_LIMIT = 1 << 16
+
+
+def _search(snapshot, depth, time_limit):
+    '''
+    runs the engine on a copy of a position, in the executor
+    :param snapshot: Snapshot of the game
+    :param depth: deepest iteration
+    :param time_limit: seconds the search may take, or None
+    :return: (move, score)
+    '''
+    game = ChessVar.from_snapshot(snapshot)
+    move = game.best_move(depth=depth, time_limit=time_limit)
+    return move, game.get_search_info()['score']
+
+
+class GameServer:
+    '''
+    holds games by number for any connection to use, so a client can reconnect and carry on; engine searches run
+    in an executor on a snapshot of the game, so they never hold up the event loop or the game
+    '''
+
+    def __init__(self, executor=None, max_games=100000, max_depth=6):
+        '''
+        :param executor: concurrent.futures executor for engine searches, a process pool made on first use by
+        default
+        :param max_games: games held at once; creating more is refused until some are closed
+        :param max_depth: deepest search a client may ask for
+        '''
+        self._games = {}
+        self._next_game = 1
+        self._executor = executor
+        self._max_games = max_games
+        self._max_depth = max_depth
+
+    def get_game(self, number):
+        '''
+        gets a hosted game
+        :param number: game number given by "new"
+        :return: ChessVar, or None
+        '''
+        return self._games.get(number)
+
+    def __len__(self):
+        return len(self._games)
+
+    def handle(self, request):
+        '''
+        serves every request except "best", which needs the executor
+        :param request: decoded request
+        :return: response dict
+        '''
+        op = request.get('op')
+        if op == 'new':
+            if len(self._games) >= self._max_games:
+                return {'error': 'too many games'}
+            number = self._next_game
+            self._next_game += 1
+            self._games[number] = ChessVar()
+            return {'game': number}
+        if op == 'metrics':
+            metrics = get_metrics()
+            return {'metrics': metrics.snapshot()} if metrics is not None else {'error': 'metrics are off'}
+        game = self._games.get(request.get('game'))
+        if game is None:
+            return {'error': 'no such game'}
+        if op == 'move':
+            made, reason = game.make_moves([(request.get('start'), request.get('end'))])
+            return {'ok': made == 1, 'reason': reason, 'state': game.get_game_state()}
+        if op == 'moves':
+            made, reason = game.make_moves([(move[:2], move[2:]) for move in request.get('moves', [])])
+            return {'made': made, 'reason': reason, 'state': game.get_game_state()}
+        if op == 'state':
+            return {'state': game.get_game_state(), 'turn': 'white' if game._turn % 2 == 0 else 'black'}
+        if op == 'board':
+            return {'board': [piece.get_name() if piece != '' else '' for row in game._board for piece in row]}
+        if op == 'close':
+            del self._games[request['game']]
+            return {'ok': True}
+        return {'error': f"unknown op {op!r}"}
+
+    async def _best(self, request):
+        '''
+        serves "best" by searching a snapshot of the game in the executor
+        :param request: decoded request
+        :return: response dict
+        '''
+        game = self._games.get(request.get('game'))
+        if game is None:
+            return {'error': 'no such game'}
+        depth = request.get('depth', 3)
+        if not isinstance(depth, int) or not 1 <= depth <= self._max_depth:
+            return {'error': f"depth must be 1 to {self._max_depth}"}
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor()
+        move, score = await asyncio.get_running_loop().run_in_executor(
+            self._executor, _search, game.snapshot(), depth, request.get('time_limit'))
+        return {'move': list(move) if move is not None else None, 'score': score}
+
+    async def handle_connection(self, reader, writer):
+        '''
+        serves one connection until it closes; requests are answered one at a time and in order, and reading waits
+        while the client isn't reading its answers
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        :return: nothing
+        '''
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # the line was longer than the stream limit, so the stream can't be trusted any more
+                    writer.write(b'{"error": "line too long"}\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError
+                    response = await self._best(request) if request.get('op') == 'best' else self.handle(request)
+                except (ValueError, TypeError):
+                    # not JSON, or fields of the wrong type such as a list for a square
+                    response = {'error': 'bad request'}
+                else:
+                    if 'id' in request:
+                        response['id'] = request['id']
+                writer.write(json.dumps(response).encode() + b'\n')
+                # backpressure: stop reading requests until the client has taken the answers
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        '''
+        starts listening
+        :param host: address to listen on
+        :param port: port to listen on, 0 for any free port
+        :return: asyncio.Server, already serving
+        '''
+        return await asyncio.start_server(self.handle_connection, host, port, limit=_LIMIT)
+
+    def close(self):
+        '''
+        shuts down the executor
+        :return: nothing
+        '''
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+async def _client(host, port, games, max_plies, rng, stats):
+    '''
+    one load testing connection: plays random games to the end, one request per move
+    :return: nothing
+    '''
+    reader, writer = await asyncio.open_connection(host, port, limit=_LIMIT)
+
+    async def ask(request):
+        writer.write(json.dumps(request).encode() + b'\n')
+        await writer.drain()
+        stats['requests'] += 1
+        return json.loads(await reader.readline())
+
+    for _ in range(games):
+        number = (await ask({'op': 'new'}))['game']
+        # a local copy picks the moves, and checks the server agrees with it
+        game = ChessVar()
+        for _ in range(max_plies):
+            if game.get_game_state() != 'UNFINISHED':
+                break
+            s_sq, e_sq = rng.choice(game._gen_moves())
+            start, end = _SQUARE_NAMES[s_sq], _SQUARE_NAMES[e_sq]
+            game.make_move(start, end)
+            answer = await ask({'op': 'move', 'game': number, 'start': start, 'end': end})
+            if not answer.get('ok') or answer['state'] != game.get_game_state():
+                stats['errors'] += 1
+        await ask({'op': 'close', 'game': number})
+        stats['games'] += 1
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(host, port, connections=100, games=10, max_plies=200, seed=0):
+    '''
+    stands in for many clients at once, each playing random games over its own connection
+    :param host: server address
+    :param port: server port
+    :param connections: connections open at the same time
+    :param games: games played one after another on each connection
+    :param max_plies: plies after which a game is abandoned
+    :param seed: seed of the random moves
+    :return: dict with the number of games, requests and errors, seconds taken and requests per second
+    '''
+    stats = {'games': 0, 'requests': 0, 'errors': 0}
+    start_time = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, games, max_plies, random.Random(f"{seed}:{i}"), stats)
+                           for i in range(connections)])
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['requests_per_second'] = stats['requests'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    return stats
+
+
+async def _serve_forever(host, port, workers):
+    '''
+    runs a server until it is interrupted
+    :return: nothing
+    '''
+    server = GameServer(ProcessPoolExecutor(max_workers=workers))
+    listener = await server.serve(host, port)
+    print(f"serving on {', '.join(str(sock.getsockname()) for sock in listener.sockets)}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    '''
+    command line entry point
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status
+    '''
+    parser = argparse.ArgumentParser(prog='python server.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='host games')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--workers', type=int, default=None, help='engine processes, one per core by default')
+    serve_parser.add_argument('--metrics', action='store_true', help='count moves for the "metrics" request')
+    load_parser = commands.add_parser('load', help='play random games against a running server')
+    load_parser.add_argument('--host', default='127.0.0.1')
+    load_parser.add_argument('--port', type=int, default=8765)
+    load_parser.add_argument('--connections', type=int, default=100)
+    load_parser.add_argument('--games', type=int, default=10, help='games per connection')
+    load_parser.add_argument('--max-plies', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        if args.metrics:
+            enable_metrics()
+        try:
+            asyncio.run(_serve_forever(args.host, args.port, args.workers))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    stats = asyncio.run(load_test(args.host, args.port, args.connections, args.games, args.max_plies))
+    print(f"{stats['games']} games, {stats['requests']} requests in {stats['seconds']:.2f} s, "
+          f"{stats['requests_per_second']:.0f} requests/s, {stats['errors']} errors")
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
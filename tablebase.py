@@ -0,0 +1,367 @@
+# retrograde endgame tablebases for small sets of pieces, stored in files probed through mmap
+
+import argparse
+import mmap
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessVar import _BIT, _BISHOP_RAYS, _KING_ATTACKS, _KNIGHT_ATTACKS, _PAWN_ATTACKS, _ROOK_RAYS, _SQUARE_NAMES
+from ChessVar import _ray_attacks
+
+# file layout: _MAGIC, a version byte, the number of pieces and their names padded to 10 bytes, then one 16-bit
+# little-endian value per position: 0 for a draw, an odd number of plies for a win of the side to move and an even
+# number for a loss, counting the plies up to and including the capture that ends the game
+_MAGIC = b'CVTB'
+_VERSION = 1
+_HEADER_SIZE = 16
+ILLEGAL = 0xFFFF
+
+
+def parse_material(material):
+    '''
+    turns a material set such as 'KNvKB' (white king and knight against black king and bishop) into piece names
+    :param material: white pieces, 'v', black pieces, each a string of 'KQRBNP'
+    :return: list of ChessVar piece names, white (lowercase) first
+    '''
+    white, sep, black = material.upper().partition('V')
+    if not sep or not white or not black or any(name not in 'KQRBNP' for name in white + black):
+        raise ValueError(f"material set should look like 'KNvKB', not {material!r}")
+    # with at most one piece of each type, every capture takes the last of its type and ends the game, so the
+    # pieces on the board never change and each set is solved on its own
+    if len(set(white)) != len(white) or len(set(black)) != len(black):
+        raise ValueError('a side can have at most one piece of each type')
+    if len(white) + len(black) > 5:
+        raise ValueError('at most 5 pieces')
+    return list(white.lower()) + list(black)
+
+
+def _targets(name, sq, own, opp):
+    '''
+    gets the squares a piece can move to
+    :param name: piece name
+    :param sq: its square
+    :param own: occupancy of its side
+    :param opp: occupancy of the other side
+    :return: bitboard of end squares, captures included
+    '''
+    kind = name.lower()
+    if kind == 'n':
+        return _KNIGHT_ATTACKS[sq] & ~own
+    if kind == 'k':
+        return _KING_ATTACKS[sq] & ~own
+    if kind == 'p':
+        color = 'white' if name == 'p' else 'black'
+        step, first_row = (-8, 6) if name == 'p' else (8, 1)
+        targets = _PAWN_ATTACKS[color][sq] & opp
+        if 0 <= sq + step < 64 and not (own | opp) & _BIT[sq + step]:
+            targets |= _BIT[sq + step]
+            if sq >> 3 == first_row and not (own | opp) & _BIT[sq + 2 * step]:
+                targets |= _BIT[sq + 2 * step]
+        return targets
+    rays = _ROOK_RAYS if kind == 'r' else _BISHOP_RAYS if kind == 'b' else _ROOK_RAYS + _BISHOP_RAYS
+    return _ray_attacks(sq, own | opp, rays) & ~own
+
+
+def _sources(name, sq, occ):
+    '''
+    gets the squares a piece on sq could have come from with a move that didn't capture
+    :param name: piece name
+    :param sq: its square
+    :param occ: occupancy of both sides
+    :return: bitboard of start squares
+    '''
+    kind = name.lower()
+    if kind != 'p':
+        # every other piece moves the same way forwards and backwards
+        return _targets(name, sq, occ, 0)
+    step, double_row = (8, 4) if name == 'p' else (-8, 3)
+    sources = 0
+    if 0 <= sq + step < 64 and not occ & _BIT[sq + step]:
+        sources |= _BIT[sq + step]
+        if sq >> 3 == double_row and not occ & _BIT[sq + 2 * step]:
+            sources |= _BIT[sq + 2 * step]
+    return sources
+
+
+def _squares(index, n):
+    '''
+    splits a position index into the side to move and the piece squares
+    :return: (side, list of squares) where side is 0 for white
+    '''
+    squares = []
+    for _ in range(n):
+        index, sq = divmod(index, 64)
+        squares.append(sq)
+    return index, squares[::-1]
+
+
+def _index(side, squares):
+    '''
+    makes the position index of the side to move and the piece squares
+    :return: index
+    '''
+    index = side
+    for sq in squares:
+        index = index * 64 + sq
+    return index
+
+
+def _classify(names, first, count):
+    '''
+    finds the positions decided without looking ahead, in a worker process: illegal ones, ones where the side to
+    move can capture (a win in 1) and ones with no moves (a draw); every other position gets its number of moves
+    :param names: piece names as from parse_material()
+    :param first: first position index
+    :param count: number of positions
+    :return: (values, move counts) as bytes of 16-bit arrays
+    '''
+    n = len(names)
+    white = [i for i, name in enumerate(names) if name.islower()]
+    black = [i for i, name in enumerate(names) if name.isupper()]
+    values, counts = array('H', bytes(2 * count)), array('H', bytes(2 * count))
+    for offset in range(count):
+        side, squares = _squares(first + offset, n)
+        occ = 0
+        for sq in squares:
+            occ |= _BIT[sq]
+        if bin(occ).count('1') != n:
+            values[offset] = ILLEGAL
+            continue
+        movers, others = (white, black) if side == 0 else (black, white)
+        own = opp = 0
+        for i in movers:
+            own |= _BIT[squares[i]]
+        for i in others:
+            opp |= _BIT[squares[i]]
+        moves = 0
+        for i in movers:
+            targets = _targets(names[i], squares[i], own, opp)
+            if targets & opp:
+                values[offset] = 1
+                break
+            moves += bin(targets).count('1')
+        else:
+            counts[offset] = moves
+    return values.tobytes(), counts.tobytes()
+
+
+def generate(material, path, workers=1, chunk_size=1 << 16):
+    '''
+    solves every position of a material set by retrograde analysis and writes the table; the first pass, which
+    looks at every position, is split across processes, and the passes going backwards from the decided positions
+    run in this process
+    :param material: material set such as 'KNvKB'
+    :param path: file to write
+    :param workers: processes for the first pass
+    :param chunk_size: positions per task
+    :return: dict with the number of wins, losses and draws for the side to move, and the longest win in plies
+    '''
+    names = parse_material(material)
+    n = len(names)
+    total = 2 * 64 ** n
+    tasks = [(first, min(chunk_size, total - first)) for first in range(0, total, chunk_size)]
+    values, counts = array('H'), array('H')
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_classify, [names] * len(tasks), *zip(*tasks))
+            for chunk_values, chunk_counts in results:
+                values.frombytes(chunk_values)
+                counts.frombytes(chunk_counts)
+    else:
+        for first, count in tasks:
+            chunk_values, chunk_counts = _classify(names, first, count)
+            values.frombytes(chunk_values)
+            counts.frombytes(chunk_counts)
+
+    sides = ([i for i, name in enumerate(names) if name.islower()],
+             [i for i, name in enumerate(names) if name.isupper()])
+    frontier = [index for index in range(total) if values[index] == 1]
+    distance = 1
+    while frontier:
+        found = []
+        for index in frontier:
+            side, squares = _squares(index, n)
+            won = distance % 2 == 1
+            occ = 0
+            for sq in squares:
+                occ |= _BIT[sq]
+            # the position was reached by a move of the other side
+            for i in sides[1 - side]:
+                sources = _sources(names[i], squares[i], occ)
+                while sources:
+                    low = sources & -sources
+                    sources ^= low
+                    squares_before = list(squares)
+                    squares_before[i] = low.bit_length() - 1
+                    before = _index(1 - side, squares_before)
+                    if values[before] != 0:
+                        continue
+                    if not won:
+                        # a move into a lost position wins
+                        values[before] = distance + 1
+                        found.append(before)
+                    else:
+                        # a position is lost once every move leads to a win for the other side
+                        counts[before] -= 1
+                        if counts[before] == 0:
+                            values[before] = distance + 1
+                            found.append(before)
+        frontier = found
+        distance += 1
+
+    if sys.byteorder != 'little':
+        values.byteswap()
+    with open(path, 'wb') as f:
+        f.write(_MAGIC + bytes([_VERSION, n]) + ''.join(names).encode().ljust(_HEADER_SIZE - 6, b'\0'))
+        values.tofile(f)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    stats = {'wins': 0, 'losses': 0, 'draws': 0, 'longest': 0}
+    for value in values:
+        if value == ILLEGAL:
+            continue
+        if value == 0:
+            stats['draws'] += 1
+        elif value % 2 == 1:
+            stats['wins'] += 1
+            stats['longest'] = max(stats['longest'], value)
+        else:
+            stats['losses'] += 1
+    return stats
+
+
+class Tablebase:
+    '''
+    a solved material set, mapped into memory; probing a position reads one value
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: file written by generate()
+        '''
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = self._map[:_HEADER_SIZE]
+        if header[:4] != _MAGIC or header[4] != _VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a tablebase file")
+        self._names = list(header[6:6 + header[5]].decode())
+        self._values = memoryview(self._map)[_HEADER_SIZE:].cast('H')
+
+    def get_names(self):
+        '''
+        gets the pieces of the material set
+        :return: list of piece names, white first
+        '''
+        return list(self._names)
+
+    def _value(self, game):
+        '''
+        gets the stored value of a game's position
+        :return: the value, or None if the position isn't in this table or is stored as ILLEGAL
+        '''
+        if game._state != 'UNFINISHED':
+            return None
+        where = {}
+        for sq in range(64):
+            piece = game._board[sq >> 3][sq & 7]
+            if piece != '':
+                name = piece.get_name()
+                if name in where:
+                    return None
+                where[name] = sq
+        if len(where) != len(self._names) or any(name not in where for name in self._names):
+            return None
+        value = self._values[_index(game._turn % 2, [where[name] for name in self._names])]
+        if sys.byteorder != 'little':
+            value = (value >> 8) | (value & 255) << 8
+        # ILLEGAL is odd, so it would otherwise read as a win in 65535 plies
+        return None if value == ILLEGAL else value
+
+    def probe(self, game):
+        '''
+        looks up a position
+        :param game: ChessVar holding exactly the pieces of the material set
+        :return: ('WIN', 'LOSS' or 'DRAW' for the side to move, plies to the capture that ends the game), or None if
+        the position isn't in this table
+        '''
+        value = self._value(game)
+        if value is None:
+            return None
+        if value == 0:
+            return 'DRAW', 0
+        return ('WIN' if value % 2 == 1 else 'LOSS'), value
+
+    def best_move(self, game):
+        '''
+        picks the move that wins fastest, or draws, or loses slowest
+        :param game: ChessVar holding exactly the pieces of the material set
+        :return: the move as a (start, end) pair in algebraic notation, or None if the position or a position one
+        move away isn't in this table, or it has no moves
+        '''
+        if self._value(game) is None:
+            return None
+        best, best_rank = None, None
+        for s_sq, e_sq in game._gen_moves():
+            game._push(s_sq, e_sq)
+            # a game won by the move was won by the capture; otherwise the value is for the other side
+            value = self._value(game) if game._state == 'UNFINISHED' else 0
+            captured = game._state == 'WHITE_WON' or game._state == 'BLACK_WON'
+            game._pop()
+            if value is None:
+                # a move into a position the table doesn't hold can't be ranked against the others
+                return None
+            if captured:
+                rank = (0, 0)
+            elif value != 0 and value % 2 == 0:
+                rank = (1, value)
+            elif value == 0:
+                rank = (2, 0)
+            else:
+                rank = (3, -value)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = (s_sq, e_sq), rank
+        return (_SQUARE_NAMES[best[0]], _SQUARE_NAMES[best[1]]) if best is not None else None
+
+    def close(self):
+        '''
+        unmaps and closes the file
+        :return: nothing
+        '''
+        if getattr(self, '_values', None) is not None:
+            self._values.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    '''
+    command line entry point
+    :param argv: arguments, sys.argv[1:] by default
+    :return: exit status
+    '''
+    parser = argparse.ArgumentParser(prog='python tablebase.py')
+    parser.add_argument('materials', nargs='+', help="material sets such as KNvKB, white first")
+    parser.add_argument('--dir', default='.', help='directory to write the tables to')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    for material in args.materials:
+        path = os.path.join(args.dir, material + '.cvtb')
+        start_time = time.perf_counter()
+        stats = generate(material, path, args.workers)
+        print(f"{path}: {stats['wins']} wins, {stats['losses']} losses, {stats['draws']} draws, "
+              f"longest win {stats['longest']} plies, {time.perf_counter() - start_time:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())